@@ -0,0 +1,75 @@
+"""
+In-process cache for the public product catalog.
+
+Product listings change a few times a day but are read on every menu load,
+so listing pages are kept in memory, keyed by (category, active_only, limit,
+cursor), and dropped whenever a product write goes through the API. The
+cache itself is unbounded: callers only cache a fixed set of views (in
+server.py, the first full page of the menu and of each category in
+CATALOG_CACHED_CATEGORIES).
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Safety net for multi-worker deployments: a write only invalidates the cache
+# of the worker that handled it, so other workers refresh after this many seconds.
+DEFAULT_TTL_SECONDS = float(os.environ.get("CATALOG_CACHE_TTL", "60"))
+
+
+class CatalogCache:
+    def __init__(self, ttl: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        # Bumped on every invalidation so a load that raced with a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _fresh(self, stored_at: float) -> bool:
+        return self.ttl is None or self.ttl <= 0 or time.monotonic() - stored_at < self.ttl
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, calling loader on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None and self._fresh(entry[0]):
+            self.hits += 1
+            return entry[1]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have filled the entry while we waited
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            generation = self._generation
+            value = await loader()
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), value)
+            return value
+
+    def invalidate(self) -> List[Hashable]:
+        """Drop every cached view (called after any product write) and return their keys"""
+        keys = list(self._entries)
+        self._generation += 1
+        self._entries.clear()
+        self.invalidations += 1
+        return keys
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,227 @@
+"""
+Response compression for API payloads.
+
+Catalog pages and order histories are large JSON documents full of repeated
+keys and long image URLs, which shrink by 80-90% under gzip or brotli.
+CompressionMiddleware negotiates an encoding from Accept-Encoding and
+compresses responses above a size threshold. It leaves alone:
+
+  * responses that already carry a Content-Encoding (the pre-rendered catalog)
+  * images and other formats that are compressed already
+  * file sends (pathsend / zerocopysend) and empty statuses such as 304
+
+Per-route byte counts are kept in CompressionStats so the savings can be
+checked on a live deployment.
+"""
+
+import gzip
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from serialization import negotiate_encoding
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is listed in requirements.txt
+    brotli = None
+
+# Below this many bytes the headers cost more than compression saves
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+# Per-request compression runs on the event loop, so favour speed over ratio
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+
+INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+INCOMPRESSIBLE_TYPES = {"application/zip", "application/gzip", "application/x-brotli", "application/pdf"}
+SKIPPED_STATUSES = {204, 206, 304}
+
+
+class CompressionStats:
+    """Bytes before and after compression, per route"""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, original: int, sent: int, compressed: bool) -> None:
+        entry = self.routes.setdefault(
+            route, {"responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+        )
+        entry["responses"] += 1
+        entry["compressed"] += int(compressed)
+        entry["bytes_in"] += original
+        entry["bytes_out"] += sent
+
+    def snapshot(self) -> Dict[str, Any]:
+        routes = {}
+        for route, entry in sorted(self.routes.items()):
+            saved = entry["bytes_in"] - entry["bytes_out"]
+            routes[route] = {
+                **entry,
+                "bytes_saved": saved,
+                "ratio": round(entry["bytes_out"] / entry["bytes_in"], 4) if entry["bytes_in"] else 1.0,
+            }
+        return {
+            "min_size": COMPRESSION_MIN_SIZE,
+            "gzip_level": COMPRESSION_GZIP_LEVEL,
+            "brotli_quality": COMPRESSION_BROTLI_QUALITY if brotli is not None else None,
+            "bytes_saved": sum(route["bytes_saved"] for route in routes.values()),
+            "routes": routes,
+        }
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if not media_type or media_type in INCOMPRESSIBLE_TYPES:
+        return False
+    return not media_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+class _Compressor:
+    """Incremental gzip or brotli encoder"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 writes a gzip header and trailer
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware that gzip- or brotli-encodes eligible responses"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        stats: Optional[CompressionStats] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats if stats is not None else CompressionStats()
+        self.available = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.available)
+        responder = _CompressionResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, send: Send, encoding: Optional[str]):
+        self.middleware = middleware
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+        self.original_size = 0
+        self.sent_size = 0
+
+    def route(self) -> str:
+        # FastAPI stores the matched route in the scope while routing
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def eligible(self, message: Message) -> bool:
+        if self.encoding is None or message["status"] in SKIPPED_STATUSES:
+            return False
+        headers = Headers(raw=message.get("headers", []))
+        if "content-encoding" in headers:
+            return False
+        return is_compressible(headers.get("content-type", ""))
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start = message
+            self.passthrough = not self.eligible(message)
+            if self.passthrough:
+                await self.downstream(message)
+            return
+        if self.passthrough or message_type != "http.response.body":
+            # File sends and other extensions go out untouched
+            if self.start is not None and not self.passthrough:
+                await self.downstream(self.start)
+                self.start = None
+                self.passthrough = True
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self.original_size += len(body)
+
+        if self.start is not None and not more_body:
+            # The whole body arrived at once: compress it in one go if it is big enough
+            await self.send_complete(body)
+            return
+
+        if self.start is not None:
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers = self.compressed_headers(self.start)
+            del headers["content-length"]
+            await self.downstream(self.start)
+            self.start = None
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+            self.sent_size += len(chunk)
+            self.middleware.stats.record(self.route(), self.original_size, self.sent_size, True)
+        else:
+            self.sent_size += len(chunk)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def send_complete(self, body: bytes) -> None:
+        start, self.start = self.start, None
+        if len(body) < self.middleware.minimum_size:
+            self.middleware.stats.record(self.route(), len(body), len(body), False)
+            await self.downstream(start)
+            await self.downstream({"type": "http.response.body", "body": body})
+            return
+
+        if self.encoding == "br":
+            compressed = brotli.compress(body, quality=self.middleware.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.middleware.gzip_level, mtime=0)
+        headers = self.compressed_headers(start)
+        headers["Content-Length"] = str(len(compressed))
+        self.middleware.stats.record(self.route(), len(body), len(compressed), True)
+        await self.downstream(start)
+        await self.downstream({"type": "http.response.body", "body": compressed})
+
+    def compressed_headers(self, start: Message) -> MutableHeaders:
+        headers = MutableHeaders(scope=start)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The encoded bytes differ from the identity ones, so the validator is only weak
+            headers["ETag"] = "W/" + etag
+        return headers
+
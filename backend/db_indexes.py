@@ -0,0 +1,71 @@
+"""
+Declarative MongoDB index registry, applied on every startup.
+
+create_index is a no-op when an identical index already exists, so running
+ensure_indexes on each boot is safe and cheap.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: Sequence[Tuple[str, int]]
+    options: Dict[str, Any] = {}
+
+
+INDEXES: List[IndexSpec] = [
+    # Point lookups by our own uuid ids
+    IndexSpec("products", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    IndexSpec("orders", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    IndexSpec("users", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    # Keyset pagination: catalog by (name, id), orders newest first by (order_date, id)
+    IndexSpec("products", [("name", ASCENDING), ("id", ASCENDING)], {"name": "name_id"}),
+    IndexSpec("orders", [("order_date", DESCENDING), ("id", DESCENDING)], {"name": "order_date_id"}),
+    # Order history per user, newest first
+    IndexSpec(
+        "orders",
+        [("user_id", ASCENDING), ("order_date", DESCENDING), ("id", DESCENDING)],
+        {"name": "user_id_order_date_id"},
+    ),
+    # Admin order board filtered by status, newest first
+    IndexSpec(
+        "orders",
+        [("order_status", ASCENDING), ("order_date", DESCENDING), ("id", DESCENDING)],
+        {"name": "order_status_order_date_id"},
+    ),
+    # OTP login lookups
+    IndexSpec("users", [("email", ASCENDING)], {"name": "email"}),
+    IndexSpec("users", [("phone", ASCENDING)], {"name": "phone"}),
+    # Latest code per identity when OTP_STORE=mongo
+    IndexSpec("otp_codes", [("email", ASCENDING)], {"name": "email"}),
+    IndexSpec("otp_codes", [("phone", ASCENDING)], {"name": "phone"}),
+    # Uploaded images and their resized variants
+    IndexSpec("images", [("url", ASCENDING)], {"name": "url_unique", "unique": True}),
+    IndexSpec("images", [("ref_count", ASCENDING), ("updated_at", ASCENDING)], {"name": "ref_count_updated_at"}),
+    # Catalog delta sync reads the change log by version
+    IndexSpec("catalog_changes", [("version", ASCENDING)], {"name": "version"}),
+    # Expired OTP codes are removed by MongoDB's TTL monitor
+    IndexSpec("otp_codes", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+]
+
+
+async def ensure_indexes(db, logger: logging.Logger, indexes: List[IndexSpec] = INDEXES) -> None:
+    """Create every registered index, logging per-index timings"""
+    started = time.perf_counter()
+    for spec in indexes:
+        index_started = time.perf_counter()
+        try:
+            name = await db[spec.collection].create_index(list(spec.keys), **spec.options)
+        except PyMongoError as e:
+            # A bad index (e.g. duplicates blocking a unique one) must not stop the API from booting
+            logger.error(f"Failed to create index on {spec.collection} {list(spec.keys)}: {e}")
+            continue
+        elapsed_ms = (time.perf_counter() - index_started) * 1000
+        logger.info(f"Index {spec.collection}.{name} ready in {elapsed_ms:.1f}ms")
+    logger.info(f"Ensured {len(indexes)} indexes in {(time.perf_counter() - started) * 1000:.1f}ms")
@@ -0,0 +1,384 @@
+"""
+Product image uploads.
+
+Uploads are streamed to disk in chunks, with every blocking file operation
+pushed to the thread pool so large photos never stall the event loop. The
+multipart body is parsed as it arrives, so an oversized upload is refused
+from its Content-Length or at the first byte past the limit, not after it
+has been spooled.
+Resized WebP/JPEG variants are then rendered in a separate process pool,
+since Pillow work is CPU-bound and would otherwise hold the GIL.
+
+Images are content-addressed: each file is stored as
+UPLOAD_DIR/<h[0:2]>/<h[2:4]>/<sha256><ext>, with its variants in the sibling
+directory <sha256>/. The extension comes from the bytes themselves, not the
+client's filename, so identical uploads always share one file, one record and
+one variants directory, and a URL never changes meaning, so it can be cached
+forever.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Deque, Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import python_multipart as multipart
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "uploads"))
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", str(5 * 1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+# Room for boundaries, part headers and small form fields around the image itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+ALLOWED_CONTENT_TYPES = set(CONTENT_TYPE_EXTENSIONS)
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+# Leading bytes of each accepted format and the extension it is stored under
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+SNIFF_BYTES = 12
+
+# Path of a content-addressed original or variant below UPLOAD_DIR
+CONTENT_ADDRESSED_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z]+|/\d+\.[a-z]+)$")
+
+# Widths rendered for every upload: menu grid thumbnails, cards and full-screen views
+VARIANT_WIDTHS = (160, 480, 1080)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def image_extension(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    """Pick the stored file extension from the content type or the client filename"""
+    if content_type in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[content_type]
+    ext = Path(filename or "").suffix.lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image extension '{ext}'")
+    return ".jpg" if ext == ".jpeg" else ext
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """Stored extension for an image from its first SNIFF_BYTES bytes, or None if unrecognised"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def content_path(digest: str, ext: str) -> Path:
+    return UPLOAD_DIR / digest[:2] / digest[2:4] / f"{digest}{ext}"
+
+
+def url_to_path(image_url: str) -> Path:
+    return UPLOAD_DIR / image_url[len("/uploads/"):]
+
+
+def path_to_url(path: Path) -> str:
+    # Return relative URL (in production, use proper image hosting)
+    return "/uploads/" + path.relative_to(UPLOAD_DIR).as_posix()
+
+
+def is_content_addressed(relative_path: str) -> bool:
+    return CONTENT_ADDRESSED_RE.match(relative_path) is not None
+
+
+def format_size(size: int) -> str:
+    for unit, scale in (("MB", 1024 * 1024), ("KB", 1024)):
+        if size >= scale:
+            return f"{size / scale:.4g} {unit}"
+    return f"{size} bytes"
+
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Image exceeds the {format_size(MAX_IMAGE_BYTES)} limit")
+
+
+def _move_into_place(temp_path: Path, final_path: Path) -> None:
+    for attempt in range(3):
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(temp_path, final_path)
+            return
+        except FileNotFoundError:
+            # A rejected upload's cleanup removed the empty shard directory in between
+            if attempt == 2 or not temp_path.exists():
+                raise
+
+
+def _remove_empty_shards(source: Path) -> None:
+    for directory in (source.parent, source.parent.parent):
+        try:
+            directory.rmdir()
+        except OSError:
+            # Not empty: other images share the shard
+            return
+
+
+async def save_image_stream(chunks: AsyncIterator[bytes]) -> Tuple[str, bool]:
+    """Store chunks under their content hash and sniffed extension, enforcing MAX_IMAGE_BYTES.
+
+    Returns (image URL, created) where created is False if identical bytes were already stored.
+    """
+    await run_in_threadpool(UPLOAD_DIR.mkdir, parents=True, exist_ok=True)
+
+    # Write to a temporary name; the final name is only known once the hash is
+    temp_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+    f = await run_in_threadpool(open, temp_path, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise too_large()
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+            digest.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+        await run_in_threadpool(f.close)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty image upload")
+        ext = sniff_extension(head)
+        if ext is None:
+            raise HTTPException(status_code=400, detail="Invalid image")
+
+        final_path = content_path(digest.hexdigest(), ext)
+        created = not await run_in_threadpool(final_path.exists)
+        if created:
+            await run_in_threadpool(_move_into_place, temp_path, final_path)
+        else:
+            await run_in_threadpool(temp_path.unlink)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(temp_path.unlink, missing_ok=True)
+        raise
+
+    return path_to_url(final_path), created
+
+
+class MultipartFileReader:
+    """Parses a multipart/form-data request body as it arrives and yields one file field's bytes"""
+
+    def __init__(self, request: Request, field: str):
+        content_type, params = multipart.multipart.parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+        self.field = field.encode()
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.found = False
+        self.done = False
+        self._stream = request.stream()
+        self._received = 0
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._pending: Deque[bytes] = deque()
+        self._parser = multipart.MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = multipart.multipart.parse_options_header(self._headers.get(b"content-disposition", b""))
+        if not self.found and options.get(b"name") == self.field and b"filename" in options:
+            self.found = self._in_file = True
+            self.filename = options[b"filename"].decode("latin-1")
+            self.content_type = self._headers.get(b"content-type", b"").decode("latin-1").strip() or None
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._pending.append(bytes(data[start:end]))
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self.done = True
+
+    async def _read(self) -> bool:
+        """Feed the next piece of the body to the parser; False once the body is exhausted"""
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            return False
+        self._received += len(chunk)
+        if self._received > MAX_IMAGE_BYTES + MULTIPART_OVERHEAD_BYTES:
+            raise too_large()
+        try:
+            self._parser.write(chunk)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+        return True
+
+    async def open(self) -> None:
+        """Read up to the end of the file part's headers"""
+        while not self.found:
+            if not await self._read():
+                raise HTTPException(status_code=400, detail=f"Missing file field '{self.field.decode()}'")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self.done:
+                return
+            if not await self._read():
+                raise HTTPException(status_code=400, detail="Upload ended before the file was complete")
+
+
+async def save_multipart_upload(request: Request, field: str = "file") -> Tuple[str, bool]:
+    """Stream the file field of a multipart request to disk as it arrives; returns (image URL, created)"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise too_large()
+
+    reader = MultipartFileReader(request, field)
+    await reader.open()
+    if reader.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported image type {reader.content_type}")
+    return await save_image_stream(reader.chunks())
+
+
+async def save_base64_image(image_data: str, filename: str) -> Tuple[str, bool]:
+    """Save base64 image data; returns (image URL, created)"""
+    # Only screens the filename; the stored extension is sniffed from the bytes
+    image_extension(filename)
+    # Remove data:image/jpeg;base64, prefix if present
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+
+    # Reject oversized payloads before decoding (base64 inflates by 4/3)
+    if len(image_data) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise too_large()
+
+    try:
+        image_bytes = await run_in_threadpool(base64.b64decode, image_data)
+    except (binascii.Error, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Failed to save image: {str(e)}")
+
+    async def chunks():
+        for start in range(0, len(image_bytes), CHUNK_SIZE):
+            yield image_bytes[start:start + CHUNK_SIZE]
+
+    return await save_image_stream(chunks())
+
+
+def render_variants(source: str, out_dir: str, widths: Sequence[int] = VARIANT_WIDTHS) -> Dict[str, str]:
+    """Render resized variants of source into out_dir; runs inside the process pool"""
+    os.makedirs(out_dir, exist_ok=True)
+    variants = {}
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            # Flatten transparency onto white so JPEG variants look like the original
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        for width in widths:
+            resized = image.copy()
+            # Never upscale; small originals just get re-encoded
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for ext, (fmt, options) in VARIANT_FORMATS.items():
+                name = f"{width}.{ext}"
+                resized.save(os.path.join(out_dir, name), fmt, **options)
+                variants[f"{ext}_{width}"] = name
+    return variants
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        # Forking a process that already runs Motor's threads can copy a held lock into the child
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _image_pool
+
+
+def shutdown_image_pool() -> None:
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+async def generate_variants(image_url: str) -> Dict[str, str]:
+    """Render variants for an uploaded image and return variant name -> URL"""
+    source = url_to_path(image_url)
+    out_dir = source.with_suffix("")
+    loop = asyncio.get_running_loop()
+    try:
+        names = await loop.run_in_executor(get_image_pool(), render_variants, str(source), str(out_dir))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        await delete_image_files(image_url)
+        await run_in_threadpool(_remove_empty_shards, source)
+        # Pillow's message includes the server-side path
+        raise HTTPException(status_code=400, detail="Invalid image")
+    return {key: path_to_url(out_dir / name) for key, name in names.items()}
+
+
+def _has_sibling_original(source: Path) -> bool:
+    return any(path.is_file() for path in source.parent.glob(f"{source.stem}.*"))
+
+
+async def delete_image_files(image_url: str) -> None:
+    """Remove an original and its variants from disk"""
+    source = url_to_path(image_url)
+    await run_in_threadpool(source.unlink, missing_ok=True)
+    # Uploads stored before extensions were sniffed can share a digest, and with it the variants
+    if not await run_in_threadpool(_has_sibling_original, source):
+        await run_in_threadpool(shutil.rmtree, source.with_suffix(""), ignore_errors=True)
+
@@ -0,0 +1,240 @@
+"""
+Request metrics in the Prometheus text exposition format.
+
+MetricsMiddleware times every HTTP request and records, per method and route
+template (so /api/products/{product_id} is one series, not one per id):
+
+  * http_requests_total and http_request_errors_total
+  * http_request_duration_seconds (histogram)
+  * http_response_size_bytes (histogram, bytes on the wire)
+  * http_requests_in_progress (gauge, per method)
+
+Other subsystems publish point-in-time values, such as cache hit ratios,
+through collectors that run when /metrics is scraped. The work per request
+is a few dict lookups and a bisect. The Mongo command monitor records into
+the same registry from Motor's worker threads, so every metric guards its
+values with a lock that render() takes too.
+
+Each worker process keeps its own registry; scrape every worker, or run
+one, to see the full picture.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+# A collector returns (name, type, help, [(labels, value)]) families
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        # Copy under the lock so a series is never rendered half-updated
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in sorted(self.series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        """Register a callable that produces metric families at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def cache_collector(caches: Callable[[], Dict[str, Dict[str, float]]]) -> Callable[[], List[MetricFamily]]:
+    """Expose the stats() dicts of the in-process caches, keyed by cache name"""
+    def collect() -> List[MetricFamily]:
+        stats = caches()
+        families = []
+        for key, metric_type, help in (
+            ("hits", "counter", "Cache lookups served from memory"),
+            ("misses", "counter", "Cache lookups that went to the loader"),
+            ("hit_ratio", "gauge", "Hits divided by lookups since start"),
+            ("entries", "gauge", "Entries currently cached"),
+        ):
+            samples = [({"cache": name}, values[key]) for name, values in stats.items() if key in values]
+            suffix = "_total" if metric_type == "counter" else ""
+            families.append((f"cache_{key}{suffix}", metric_type, help, samples))
+        return families
+    return collect
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+ERRORS = registry.counter(
+    "http_request_errors_total", "Requests that failed with a 5xx or an unhandled exception", ("method", "route")
+)
+LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte", ("method", "route")
+)
+RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes", "Response body size as sent", ("method", "route"), buckets=SIZE_BUCKETS
+)
+IN_PROGRESS = registry.gauge("http_requests_in_progress", "Requests currently being handled", ("method",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records the http_* metrics for every request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_PROGRESS.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            IN_PROGRESS.dec(method)
+            # FastAPI stores the matched route in the scope; keep unmatched paths out of the label set
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUESTS.inc(method, route, str(status))
+            if status >= 500:
+                ERRORS.inc(method, route)
+            LATENCY.observe(time.perf_counter() - started, method, route)
+            RESPONSE_SIZE.observe(size, method, route)
@@ -0,0 +1,182 @@
+"""
+MongoDB command monitoring.
+
+MongoCommandMonitor is a pymongo CommandListener registered on the Motor
+client. For every database command it records:
+
+  * mongo_command_duration_seconds, a latency histogram per collection and command
+  * mongo_command_failures_total, per collection and command
+  * a warning log line for commands slower than MONGO_SLOW_QUERY_MS, showing
+    the filter shape (field names and operators, with every value redacted)
+  * a one-off warning, plus mongo_unindexable_queries_total, for filters that
+    no index can serve, such as $expr comparisons between two fields
+
+Motor runs pymongo on worker threads, so the listener callbacks take a lock
+before touching shared state.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import monitoring
+
+from metrics import MetricsRegistry
+from request_timing import add_timing
+
+logger = logging.getLogger(__name__)
+
+MONGO_SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", "100"))
+
+MONGO_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Connection handshakes and auth carry no query and would only add noise
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo", "saslStart", "saslContinue",
+    "authenticate", "getnonce", "endSessions", "killCursors",
+}
+
+# Where each command keeps its filter(s)
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+# Operators whose presence means the filter cannot be answered from an index alone
+UNINDEXABLE_OPERATORS = {
+    "$expr": "$expr compares fields per document; store the derived value (e.g. a low_stock flag) and index it",
+    "$where": "$where runs JavaScript per document; rewrite it as a query on indexed fields",
+    "$nin": "$nin matches almost every key; filter on the values you want instead",
+    "$not": "$not negations scan most of the index; filter on the values you want instead",
+}
+
+REDACTED = "?"
+
+
+def redact(value: Any) -> Any:
+    """Keep field names, operators and $field references, replace every literal with '?'"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Collapse repeats so $in lists of any length have the same shape
+        shape = []
+        for item in map(redact, value):
+            if item not in shape:
+                shape.append(item)
+        return shape
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return REDACTED
+
+
+def command_filters(command_name: str, command: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The query filters a command applies, in the order the server uses them"""
+    if command_name in FILTER_FIELDS:
+        query = command.get(FILTER_FIELDS[command_name])
+        return [query] if isinstance(query, dict) else []
+    if command_name == "aggregate":
+        filters = []
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                filters.append(stage["$match"])
+            elif "$facet" in stage:
+                for sub_pipeline in stage["$facet"].values():
+                    filters.extend(s["$match"] for s in sub_pipeline if "$match" in s)
+        return filters
+    if command_name == "update":
+        return [statement.get("q", {}) for statement in command.get("updates", [])]
+    if command_name == "delete":
+        return [statement.get("q", {}) for statement in command.get("deletes", [])]
+    return []
+
+
+def unindexable_reasons(query: Any) -> Set[str]:
+    """Operators anywhere in query that prevent an index from narrowing the scan"""
+    reasons = set()
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if key in UNINDEXABLE_OPERATORS:
+                reasons.add(key)
+            reasons |= unindexable_reasons(value)
+    elif isinstance(query, list):
+        for item in query:
+            reasons |= unindexable_reasons(item)
+    return reasons
+
+
+def command_collection(command_name: str, command: Dict[str, Any]) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", "unknown"))
+    target = command.get(command_name)
+    # aggregate: 1 runs against the database
+    return target if isinstance(target, str) else "(database)"
+
+
+class MongoCommandMonitor(monitoring.CommandListener):
+    """Latency metrics, slow-query logging and index hints for every command"""
+
+    def __init__(self, registry: MetricsRegistry, slow_query_ms: float = MONGO_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.latency = registry.histogram(
+            "mongo_command_duration_seconds", "MongoDB command round trip time",
+            ("collection", "command"), buckets=MONGO_LATENCY_BUCKETS
+        )
+        self.failures = registry.counter(
+            "mongo_command_failures_total", "MongoDB commands that returned an error", ("collection", "command")
+        )
+        self.unindexable = registry.counter(
+            "mongo_unindexable_queries_total", "Commands whose filter no index can serve",
+            ("collection", "command", "operator")
+        )
+        self._lock = threading.Lock()
+        # Started commands awaiting their result: (connection, request_id) -> (collection, filter shape)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Optional[str]]] = {}
+        self._flagged: Set[Tuple[str, str]] = set()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = command_collection(event.command_name, event.command)
+        filters = command_filters(event.command_name, event.command)
+        shape = json.dumps([redact(f) for f in filters], default=str, sort_keys=True) if filters else None
+
+        reasons = set()
+        for query in filters:
+            reasons |= unindexable_reasons(query)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, shape)
+            for operator in reasons:
+                self.unindexable.inc(collection, event.command_name, operator)
+                if (shape, operator) not in self._flagged:
+                    self._flagged.add((shape, operator))
+                    logger.warning(
+                        f"Unindexable {event.command_name} on {collection} ({operator}): "
+                        f"{UNINDEXABLE_OPERATORS[operator]}. Filter: {shape}"
+                    )
+
+    def _finish(self, event, failed: bool) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            collection, shape = self._pending.pop((event.connection_id, event.request_id), ("unknown", None))
+            self.latency.observe(event.duration_micros / 1e6, collection, event.command_name)
+            if failed:
+                self.failures.inc(collection, event.command_name)
+        elapsed_ms = event.duration_micros / 1000
+        # Runs in a copy of the request's context, so this lands in its Server-Timing
+        add_timing("db", elapsed_ms)
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(
+                f"Slow Mongo {event.command_name} on {collection}: {elapsed_ms:.1f}ms"
+                + (f" filter={shape}" if shape else "")
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
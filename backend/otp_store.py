@@ -0,0 +1,96 @@
+"""
+Storage backends for one-time login codes.
+
+The Mongo store (the default) shares codes between workers. The in-memory
+store keeps only the latest code per identity and expires codes through a
+heap, so OTP traffic never reaches the database; it is per process, so only
+use OTP_STORE=memory with a single worker, or a code requested on one worker
+cannot be verified on another.
+"""
+
+import heapq
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+Identity = Dict[str, str]
+
+
+def identity_key(identity: Identity) -> Tuple[Optional[str], Optional[str]]:
+    return identity.get("email"), identity.get("phone")
+
+
+class OTPStore(ABC):
+    @abstractmethod
+    async def save(self, identity: Identity, otp: str, ttl: timedelta) -> None:
+        """Store otp as the current code for identity, replacing any previous one"""
+
+    @abstractmethod
+    async def consume(self, identity: Identity, otp: str) -> bool:
+        """Atomically redeem otp for identity; returns False if it is wrong or expired"""
+
+
+class MemoryOTPStore(OTPStore):
+    def __init__(self):
+        # identity -> (otp, expires_at, sequence)
+        self._codes: Dict[Tuple, Tuple[str, float, int]] = {}
+        self._expiry_heap: List[Tuple[float, int, Tuple]] = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, sequence, key = heapq.heappop(self._expiry_heap)
+            # Skip heap entries for codes that were already replaced or consumed
+            current = self._codes.get(key)
+            if current is not None and current[2] == sequence:
+                del self._codes[key]
+
+    async def save(self, identity: Identity, otp: str, ttl: timedelta) -> None:
+        self._purge_expired()
+        self._sequence += 1
+        key = identity_key(identity)
+        expires_at = time.monotonic() + ttl.total_seconds()
+        self._codes[key] = (otp, expires_at, self._sequence)
+        heapq.heappush(self._expiry_heap, (expires_at, self._sequence, key))
+
+    async def consume(self, identity: Identity, otp: str) -> bool:
+        self._purge_expired()
+        key = identity_key(identity)
+        current = self._codes.get(key)
+        if current is None or current[0] != otp or current[1] <= time.monotonic():
+            return False
+        del self._codes[key]
+        return True
+
+
+class MongoOTPStore(OTPStore):
+    def __init__(self, db):
+        self.db = db
+
+    async def save(self, identity: Identity, otp: str, ttl: timedelta) -> None:
+        now = datetime.utcnow()
+        await self.db.otp_codes.update_one(
+            identity,
+            {"$set": {"otp": otp, "created_at": now, "expires_at": now + ttl, "verified": False}},
+            upsert=True
+        )
+
+    async def consume(self, identity: Identity, otp: str) -> bool:
+        otp_record = await self.db.otp_codes.find_one_and_update(
+            {**identity, "otp": otp, "verified": False, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$set": {"verified": True}}
+        )
+        return otp_record is not None
+
+
+def create_otp_store(kind: str, db) -> OTPStore:
+    if kind == "memory":
+        return MemoryOTPStore()
+    if kind == "mongo":
+        return MongoOTPStore(db)
+    raise ValueError(f"Unknown OTP_STORE '{kind}', expected 'memory' or 'mongo'")
@@ -0,0 +1,95 @@
+"""
+Keyset (cursor) pagination helpers for MongoDB listings.
+
+A cursor is an opaque, URL-safe token holding the sort-key values of the last
+document on the previous page. The next page is fetched with a range filter
+on those values, so every page is an index seek rather than a skip.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+SortSpec = Sequence[Tuple[str, int]]
+
+# Stable sort orders used by the listing endpoints; the trailing id breaks ties
+PRODUCT_SORT: SortSpec = [("name", ASCENDING), ("id", ASCENDING)]
+ORDER_SORT: SortSpec = [("order_date", DESCENDING), ("id", DESCENDING)]
+
+# The type each sort field's cursor value must have
+CURSOR_FIELD_TYPES: Dict[str, type] = {"name": str, "id": str, "order_date": datetime}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any, field: str) -> Any:
+    # Cursors come from the client and go into the query, so anything that could act as an operator is refused
+    if isinstance(value, dict):
+        if list(value) != ["$date"] or not isinstance(value["$date"], str):
+            raise InvalidCursor("Cursor values must be strings, numbers or dates")
+        value = datetime.fromisoformat(value["$date"])
+    elif isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise InvalidCursor("Cursor values must be strings, numbers or dates")
+    expected = CURSOR_FIELD_TYPES.get(field)
+    if expected is not None and not isinstance(value, expected):
+        raise InvalidCursor(f"Cursor value for {field} has the wrong type")
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise InvalidCursor("Cursor does not match this listing")
+        return [_decode_value(value, field) for value, (field, _) in zip(values, sort)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any]) -> Dict[str, Any]:
+    """Build a filter matching documents that sort strictly after values"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    sort: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of documents and the cursor for the next page (None on the last page)"""
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor, sort))
+        query = {"$and": [query, after]} if query else after
+
+    # Fetch one extra document to learn whether another page exists
+    docs = await collection.find(query).sort(list(sort)).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    next_cursor = encode_cursor([docs[-1][field] for field, _ in sort])
+    return docs, next_cursor
@@ -0,0 +1,186 @@
+"""
+On-demand statistical profiling of live requests.
+
+ProfilingMiddleware profiles a request when either:
+
+  * the request carries X-Profile-Token with a valid admin token, or
+  * it falls in the sampled fraction set by PROFILE_SAMPLE_RATE (default 0, off)
+
+While the request runs, a StackSampler thread reads the event loop thread's
+stack every PROFILE_INTERVAL_MS. The counts are written in collapsed-stack
+format (one "frame;frame;frame count" line per distinct stack), which
+flamegraph.pl and speedscope open directly. Files go to PROFILE_DIR, which
+is pruned to the newest PROFILE_MAX_FILES.
+
+The sampler sees everything the event loop runs, so requests that overlap
+the profiled one show up in its profile too. Only one request is profiled
+at a time.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "1"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_NAME_RE = re.compile(r"^[0-9]{13}-[A-Z]+-[a-z0-9_]+-[0-9a-f]{8}\.collapsed$")
+
+
+def frame_label(code) -> str:
+    # ';' separates frames and ' ' separates the count in collapsed stacks
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":").replace(" ", "_")
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                frames.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+class ProfileStore:
+    """Bounded directory of collapsed-stack profiles, oldest removed first"""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def new_name(self, method: str, path: str) -> str:
+        slug = re.sub(r"[^a-z0-9]+", "_", path.lower()).strip("_")[:60] or "root"
+        return f"{int(time.time() * 1000)}-{method}-{slug}-{uuid.uuid4().hex[:8]}.collapsed"
+
+    def path_for(self, name: str) -> Optional[Path]:
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def write(self, name: str, stacks: Counter) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.directory / f".{name}.part"
+        with open(temp_path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(temp_path, self.directory / name)
+        self.prune()
+
+    def prune(self) -> None:
+        names = sorted(p.name for p in self.directory.glob("*.collapsed"))
+        for name in names[:-self.max_files] if self.max_files > 0 else names:
+            (self.directory / name).unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, object]]:
+        if not self.directory.is_dir():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.collapsed"), reverse=True):
+            created_ms, method, slug, _ = path.stem.split("-", 3)
+            profiles.append({
+                "name": path.name,
+                "created_at": int(created_ms) / 1000,
+                "method": method,
+                "path": slug,
+                "size": path.stat().st_size,
+            })
+        return profiles
+
+
+class Profiler:
+    """Profiling settings shared by the middleware and the admin endpoints"""
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+    ):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.active = False
+
+    def settings(self) -> Dict[str, object]:
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval_ms,
+            "max_files": self.store.max_files,
+            "active": self.active,
+        }
+
+
+class ProfilingMiddleware:
+    """Profiles sampled or explicitly requested HTTP requests into the profiler's store"""
+
+    def __init__(self, app: ASGIApp, profiler: Profiler, authorize: Callable[[str], bool]):
+        self.app = app
+        self.profiler = profiler
+        self.authorize = authorize
+
+    def wanted(self, scope: Scope) -> bool:
+        token = Headers(scope=scope).get(PROFILE_HEADER)
+        if token is not None:
+            return self.authorize(token)
+        sample_rate = self.profiler.sample_rate
+        return sample_rate > 0 and random.random() < sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = self.profiler
+        if scope["type"] != "http" or profiler.active or not self.wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = profiler.store.new_name(scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        profiler.active = True
+        sampler = StackSampler(threading.get_ident(), profiler.interval_ms / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = await run_in_threadpool(sampler.stop)
+            profiler.active = False
+            if stacks:
+                await run_in_threadpool(profiler.store.write, name, stacks)
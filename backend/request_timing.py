@@ -0,0 +1,109 @@
+"""
+Per-request phase timing.
+
+ServerTimingMiddleware starts an empty timing record for each request in a
+context variable. Code on the request path adds to it:
+
+  * timed("auth") / timed("validate") / timed("serialize") around a block
+  * add_timing("db", ms) from the Mongo command monitor; Motor copies the
+    context into its worker threads, so the record is reachable there too
+
+When the response starts, the totals go out as a Server-Timing header, so
+the breakdown appears in the browser's network panel. After the response
+ends, one JSON access log line is written with the same numbers.
+
+Phases can overlap. Auth includes the user lookup that db also counts, and
+concurrent queries each add their own time to db.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+access_logger = logging.getLogger("access")
+
+# Lets cross-origin pages (the frontend) read the header; set to "" to hide it
+TIMING_ALLOW_ORIGIN = os.environ.get("TIMING_ALLOW_ORIGIN", "*")
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# db time is added from Motor's worker threads
+_lock = threading.Lock()
+
+
+def add_timing(phase: str, elapsed_ms: float) -> None:
+    """Add elapsed_ms to phase for the current request, if there is one"""
+    timings = _timings.get()
+    if timings is not None:
+        with _lock:
+            timings[phase] = timings.get(phase, 0.0) + elapsed_ms
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, (time.perf_counter() - started) * 1000)
+
+
+def server_timing_header(timings: Dict[str, float], total_ms: float) -> str:
+    entries = [f"{phase};dur={elapsed:.1f}" for phase, elapsed in timings.items()]
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """Adds Server-Timing to every HTTP response and writes a structured access log"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timings, (time.perf_counter() - started) * 1000))
+                if TIMING_ALLOW_ORIGIN:
+                    headers["Timing-Allow-Origin"] = TIMING_ALLOW_ORIGIN
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            total_ms = (time.perf_counter() - started) * 1000
+            route = getattr(scope.get("route"), "path", None)
+            client = scope.get("client")
+            access_logger.info(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status,
+                "bytes": size,
+                "client": client[0] if client else None,
+                "total_ms": round(total_ms, 2),
+                **{f"{phase}_ms": round(elapsed, 2) for phase, elapsed in timings.items()},
+            }))
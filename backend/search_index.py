@@ -0,0 +1,144 @@
+"""
+In-memory inverted index over the product catalog with BM25 ranking.
+
+Each product is tokenized from its name, tags, subcategory and description.
+Field weights are folded into the term frequencies (a simplified BM25F), and
+the final query term is also matched as a prefix so partial input like
+"pan" finds "paneer".
+"""
+
+import bisect
+import math
+import re
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.0,
+    "subcategory": 1.5,
+    "description": 1.0,
+}
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._reset()
+        self.built_at = 0.0
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._products: Dict[str, Any] = {}
+        self._sorted_terms: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def _weighted_terms(self, product) -> Dict[str, float]:
+        fields = {
+            "name": product.name,
+            "tags": " ".join(product.tags),
+            "subcategory": product.subcategory,
+            "description": product.description,
+        }
+        terms: Dict[str, float] = defaultdict(float)
+        for field, text in fields.items():
+            for token in tokenize(text):
+                terms[token] += FIELD_WEIGHTS[field]
+        return terms
+
+    def rebuild(self, products: Iterable[Any]) -> None:
+        """Replace the whole index with the given products"""
+        self._reset()
+        for product in products:
+            self.add(product)
+        self.built_at = time.monotonic()
+
+    def add(self, product) -> None:
+        """Index a product, replacing any previous version with the same id"""
+        self.remove(product.id)
+        terms = self._weighted_terms(product)
+        for term, weight in terms.items():
+            if term not in self._postings:
+                self._sorted_terms = None
+            self._postings[term][product.id] = weight
+        length = sum(terms.values())
+        self._doc_terms[product.id] = terms
+        self._doc_lengths[product.id] = length
+        self._total_length += length
+        self._products[product.id] = product
+
+    def remove(self, product_id: str) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+        self._total_length -= self._doc_lengths.pop(product_id)
+        self._products.pop(product_id, None)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        matches = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        predicate: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[List[Tuple[Any, float]], int]:
+        """Return ((product, score) page, total matches) for the query, best first"""
+        query_terms = tokenize(query)
+        if not query_terms or not self._products:
+            return [], 0
+
+        doc_count = len(self._products)
+        avg_length = self._total_length / doc_count
+        scores: Dict[str, float] = defaultdict(float)
+
+        for i, query_term in enumerate(query_terms):
+            # The last term is usually still being typed, so expand it as a prefix
+            if i == len(query_terms) - 1:
+                terms = self._prefix_terms(query_term)
+            else:
+                terms = [query_term] if query_term in self._postings else []
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, tf in postings.items():
+                    norm = K1 * (1 - B + B * self._doc_lengths[product_id] / avg_length)
+                    scores[product_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        ranked = [
+            (self._products[product_id], score)
+            for product_id, score in scores.items()
+            if predicate is None or predicate(self._products[product_id])
+        ]
+        ranked.sort(key=lambda pair: (-pair[1], pair[0].name))
+        return ranked[offset:offset + limit], len(ranked)
@@ -0,0 +1,149 @@
+"""
+Fast JSON responses for list endpoints.
+
+FastAPI validates a handler's return value against response_model and then
+runs it through jsonable_encoder and json.dumps. For lists of models that were
+just built from Mongo documents this validates everything twice and
+serializes through pure Python. Handlers here validate the raw documents once
+with a TypeAdapter, serialize them in pydantic-core and return the bytes in a
+FastJSONResponse, which FastAPI sends as-is.
+
+Payloads that are identical for every client (the public catalog) go one
+step further: PrerenderedJSON keeps the encoded body together with gzip and
+brotli variants, so serving it is a dictionary lookup and a memory copy.
+"""
+
+import gzip
+import hashlib
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse, Response
+
+from request_timing import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is listed in requirements.txt
+    brotli = None
+
+# Pre-rendered bodies are compressed once per catalog change, so use the strongest settings
+PRERENDER_GZIP_LEVEL = 9
+PRERENDER_BROTLI_QUALITY = 11
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that passes pre-encoded bytes through and encodes anything else with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if orjson is not None:
+            return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(jsonable_encoder(content))
+
+
+def validated_list_response(
+    adapter: TypeAdapter,
+    docs: Iterable[Mapping[str, Any]],
+    headers: Optional[Mapping[str, str]] = None,
+) -> FastJSONResponse:
+    """Validate documents once and return them serialized, bypassing response_model re-validation"""
+    with timed("validate"):
+        items = adapter.validate_python(docs)
+    with timed("serialize"):
+        body = adapter.dump_json(items)
+    return FastJSONResponse(body, headers=headers)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Sequence[str]) -> Optional[str]:
+    """Pick the first of available (in server preference order) that Accept-Encoding allows"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    for coding in available:
+        if weights.get(coding, weights.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate If-None-Match against etag using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def conditional_json_response(
+    body: bytes,
+    if_none_match: Optional[str],
+    etag: Optional[str] = None,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """Return body with an ETag (content hash unless given), or 304 if the client already has it"""
+    response_headers = dict(headers or {})
+    response_headers["ETag"] = etag or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    response_headers["Cache-Control"] = "no-cache"
+    if etag_matches(if_none_match, response_headers["ETag"]):
+        return Response(status_code=304, headers=response_headers)
+    return Response(body, media_type="application/json", headers=response_headers)
+
+
+class PrerenderedJSON:
+    """A JSON body encoded once, with compressed variants and a strong ETag"""
+
+    def __init__(self, body: bytes, version: int = 0):
+        self.body = body
+        # The catalog version makes the validator monotonic; the hash tells views apart
+        self.etag_base = f"v{version}-{hashlib.sha256(body).hexdigest()[:16]}"
+        self.encoded: Dict[str, bytes] = {"gzip": gzip.compress(body, compresslevel=PRERENDER_GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(body, quality=PRERENDER_BROTLI_QUALITY)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.etag_base}"'
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # Each representation needs its own strong validator
+        return f'"{self.etag_base}-{encoding}"' if encoding else self.etag
+
+    def response(
+        self,
+        accept_encoding: Optional[str],
+        if_none_match: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Response:
+        # Prefer brotli, then gzip, each only if it is actually smaller than the body
+        available = [e for e in ("br", "gzip") if e in self.encoded and len(self.encoded[e]) < len(self.body)]
+        encoding = negotiate_encoding(accept_encoding, available)
+        response_headers = dict(headers or {})
+        response_headers["ETag"] = self.etag_for(encoding)
+        response_headers["Vary"] = "Accept-Encoding"
+        # Let browsers keep the body but check back every time; unchanged views cost a 304
+        response_headers["Cache-Control"] = "no-cache"
+        if etag_matches(if_none_match, response_headers["ETag"]):
+            return Response(status_code=304, headers=response_headers)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+            return Response(self.encoded[encoding], media_type="application/json", headers=response_headers)
+        return Response(self.body, media_type="application/json", headers=response_headers)
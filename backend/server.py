@@ -1,31 +1,56 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional, Dict, Any, AsyncIterator, Union, Tuple
 import uuid
+import time
+import hashlib
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import jwt
 import bcrypt
 import random
 import string
 import re
-import base64
 import io
 from PIL import Image
 
+from catalog_cache import CatalogCache
+from compression import CompressionMiddleware, CompressionStats
+from db_indexes import ensure_indexes
+from images import (
+    delete_image_files, generate_variants, save_base64_image, save_multipart_upload, shutdown_image_pool
+)
+from image_serving import serve_upload
+from lru_cache import LRUCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, cache_collector, registry as metrics_registry
+from mongo_monitor import MongoCommandMonitor
+from otp_store import create_otp_store
+from pagination import InvalidCursor, ORDER_SORT, PRODUCT_SORT, paginate
+from profiling import ProfileStore, Profiler, ProfilingMiddleware
+from request_timing import ServerTimingMiddleware, timed
+from search_index import ProductSearchIndex
+from serialization import (
+    PrerenderedJSON, conditional_json_response, validated_list_response
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMonitor(metrics_registry)])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -49,6 +74,55 @@ ADMIN_CREDENTIALS = {
     "manager": "manager123"
 }
 
+# Public catalog listing pages, keyed by (category, active_only, limit, cursor),
+# held as pre-encoded (and pre-compressed) JSON together with the next-page cursor.
+# Only the first full page of the whole menu or one category is cached; the key is
+# client-chosen, so caching every view would let clients grow the cache without bound.
+catalog_cache = CatalogCache()
+CATALOG_PAGE_LIMIT = 1000
+CATALOG_CACHED_CATEGORIES = (None, "vegan", "vegetarian")
+catalog_warmup_task: Optional[asyncio.Task] = None
+CATALOG_WARMUP_MAX_VIEWS = 20
+
+# A catalog version is reserved before its product write and logged after it. A missing
+# version is treated as a write in flight, and syncs stop short of it, until a later
+# version has been logged for this long; after that it counts as abandoned.
+CATALOG_CHANGE_GRACE = timedelta(seconds=float(os.environ.get("CATALOG_CHANGE_GRACE", "60")))
+# How far below the counter a full snapshot looks for writes still in flight
+CATALOG_PENDING_WINDOW = 100
+
+# Precompiled customization prices: product id -> (updated_at, category -> option -> price_modifier)
+price_tables: Dict[str, Tuple[datetime, Dict[str, Dict[str, float]]]] = {}
+
+# Ranked full-text search over the catalog, updated incrementally on product writes
+search_index = ProductSearchIndex()
+SEARCH_INDEX_TTL = float(os.environ.get("SEARCH_INDEX_TTL", "300"))
+# Only one request rebuilds an expired index; the others wait for it
+search_index_lock = asyncio.Lock()
+
+# Authenticated-user resolution: token -> user id, and user id -> User
+token_cache = LRUCache(
+    maxsize=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", "300"))
+)
+user_cache = LRUCache(
+    maxsize=int(os.environ.get("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("USER_CACHE_TTL", "60"))
+)
+
+# Login codes: "mongo" shares them across workers, "memory" is only safe with a single worker
+otp_store = create_otp_store(os.environ.get("OTP_STORE", "mongo"), db)
+OTP_TTL = timedelta(minutes=10)
+
+# Admin dashboard stats, shared briefly between admins polling the dashboard
+stats_cache = CatalogCache(ttl=float(os.environ.get("STATS_CACHE_TTL", "5")))
+
+# Bytes saved by CompressionMiddleware, per route
+compression_stats = CompressionStats()
+
+# Sampled and on-demand request profiles (PROFILE_SAMPLE_RATE, X-Profile-Token)
+profiler = Profiler(ProfileStore())
+
 # Models
 class CustomizationOption(BaseModel):
     name: str
@@ -63,11 +137,13 @@ class Product(BaseModel):
     name: str
     description: str
     images: List[str]
+    image_variants: Dict[str, Dict[str, str]] = Field(default_factory=dict)  # image url -> {"webp_480": url, ...}
     category: str  # 'vegan' or 'vegetarian'
     subcategory: str  # 'north-indian', 'south-indian', 'street-food', 'sweets', 'beverages', 'snacks'
     base_price: float
     customization_options: Dict[str, CustomizationCategory] = Field(default_factory=dict)
     is_active: bool = True
+    version: int = 0  # Catalog version of the last change to this product
     stock_quantity: int = 100  # Inventory management
     min_stock_level: int = 10
     preparation_time: int = 20  # in minutes
@@ -90,6 +166,19 @@ class ProductCreate(BaseModel):
     tags: List[str] = Field(default_factory=list)
     nutrition_info: Optional[Dict[str, Any]] = None
 
+class ProductSearchResponse(BaseModel):
+    query: str
+    total: int
+    items: List[Product]
+    next_offset: Optional[int] = None
+
+class CatalogChangesResponse(BaseModel):
+    version: int  # Pass as `since` on the next sync
+    products: List[Product]  # Created or updated, including deactivated ones
+    deleted: List[str]  # Ids of products removed since `since`
+    has_more: bool = False
+    reset: bool = False  # True when this is a full snapshot: replace the local copy
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -115,6 +204,9 @@ class AdminTokenResponse(BaseModel):
     token_type: str
     username: str
 
+class ProfilingSettingsUpdate(BaseModel):
+    sample_rate: float = Field(..., ge=0, le=1)
+
 class ImageUpload(BaseModel):
     filename: str
     image_data: str  # base64 encoded image
@@ -169,6 +261,11 @@ class OrderCreate(BaseModel):
     delivery_address: Dict[str, Any]
     payment_method: str = "cod"
 
+# Bulk validators/serializers for list endpoints
+product_adapter = TypeAdapter(Product)
+product_list_adapter = TypeAdapter(List[Product])
+order_list_adapter = TypeAdapter(List[Order])
+
 # Helper Functions
 def generate_otp():
     return ''.join(random.choices(string.digits, k=6))
@@ -194,52 +291,289 @@ def create_admin_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
+    with timed("auth"):
+        token = credentials.credentials
+        user_id = token_cache.get(token)
         if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        user = await db.users.find_one({"id": user_id})
+            try:
+                payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            except jwt.PyJWTError:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+            # Never keep a token cached past its own expiry; tokens without one get the default TTL
+            expires_at = payload.get("exp")
+            token_cache.set(token, user_id, ttl=expires_at - time.time() if expires_at is not None else None)
+    
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-        return User(**user)
+            user_doc = await db.users.find_one({"id": user_id})
+            if user_doc is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+            user = User(**user_doc)
+            user_cache.set(user_id, user)
+        return user
+
+def admin_token_username(token: str) -> Optional[str]:
+    """Return the admin username for a valid admin token, else None"""
+    try:
+        payload = jwt.decode(token, ADMIN_JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.PyJWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        return None
+    username = payload.get("sub")
+    return username if username in ADMIN_CREDENTIALS else None
 
 async def get_admin_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, ADMIN_JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None or username not in ADMIN_CREDENTIALS:
+    with timed("auth"):
+        username = admin_token_username(credentials.credentials)
+        if username is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
         return {"username": username}
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
 
-def save_base64_image(image_data: str, filename: str) -> str:
-    """Save base64 image data and return the image URL"""
+def compile_price_table(product: "Product") -> Dict[str, Dict[str, float]]:
+    """Build and remember the customization price lookup table for a product"""
+    table = {
+        category: {opt.name: opt.price_modifier for opt in config.options}
+        for category, config in product.customization_options.items()
+    }
+    price_tables[product.id] = (product.updated_at, table)
+    return table
+
+def get_price_table(product: dict) -> Dict[str, Dict[str, float]]:
+    """Return the price table for a product document, recompiling it if the product changed"""
+    cached = price_tables.get(product["id"])
+    if cached and cached[0] == product.get("updated_at"):
+        return cached[1]
+    return compile_price_table(Product(**product))
+
+async def next_catalog_version(count: int = 1) -> int:
+    """Bump the catalog version shared by all workers; returns the last of `count` reserved versions"""
+    counter = await db.counters.find_one_and_update(
+        {"_id": "catalog_version"},
+        {"$inc": {"value": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
+
+async def current_catalog_version() -> int:
+    counter = await db.counters.find_one({"_id": "catalog_version"})
+    return counter["value"] if counter else 0
+
+def product_etag(product: "Product", body: bytes) -> str:
+    # Stock reservations change the body without bumping the version, so hash the body too
+    return f'"v{product.version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+
+def product_response(product: "Product", request: Request) -> Response:
+    """Product detail with an ETag, or 304 if the client's copy is current"""
+    with timed("serialize"):
+        body = product_adapter.dump_json(product)
+    return conditional_json_response(body, request.headers.get("if-none-match"), etag=product_etag(product, body))
+
+async def log_catalog_change(version: int, product_id: str, deleted: bool = False) -> None:
+    await db.catalog_changes.insert_one(
+        {"version": version, "product_id": product_id, "deleted": deleted, "changed_at": datetime.utcnow()}
+    )
+
+@asynccontextmanager
+async def catalog_change(product_id: str) -> AsyncIterator[int]:
+    """Reserve a catalog version for a write to product_id and log it once the write is done"""
+    version = await next_catalog_version()
     try:
-        # Remove data:image/jpeg;base64, prefix if present
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Decode base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
-        
-        # Save image
-        image_path = upload_dir / filename
-        with open(image_path, "wb") as f:
-            f.write(image_bytes)
-        
-        # Return relative URL (in production, use proper image hosting)
-        return f"/uploads/{filename}"
+        yield version
+    finally:
+        # Logged even if the write failed, so syncs do not hold back waiting for it
+        await log_catalog_change(version, product_id)
+
+async def logged_changes(since: int, limit: int) -> Tuple[List[dict], bool]:
+    """Change log rows after `since`, up to the first version that may still be in flight"""
+    rows = await db.catalog_changes.find(
+        {"version": {"$gt": since}}, {"_id": 0, "version": 1, "product_id": 1, "deleted": 1, "changed_at": 1}
+    ).sort("version", 1).limit(limit + 1).to_list(limit + 1)
+    settled_before = datetime.utcnow() - CATALOG_CHANGE_GRACE
+    changes = []
+    expected = since + 1
+    for row in rows:
+        if row["version"] != expected and row["changed_at"] > settled_before:
+            return changes, False
+        changes.append(row)
+        expected = row["version"] + 1
+    return changes[:limit], len(changes) > limit
+
+async def product_changed(product: "Product") -> None:
+    """Refresh the in-process catalog caches after a product was created or updated"""
+    schedule_catalog_warmup(catalog_cache.invalidate())
+    stats_cache.invalidate()
+    compile_price_table(product)
+    search_index.add(product)
+
+async def product_deleted(product_id: str) -> None:
+    """Leave a tombstone in the change log and drop the product from the in-process catalog caches"""
+    await log_catalog_change(await next_catalog_version(), product_id, deleted=True)
+    schedule_catalog_warmup(catalog_cache.invalidate())
+    stats_cache.invalidate()
+    price_tables.pop(product_id, None)
+    search_index.remove(product_id)
+
+def catalog_query(category: Optional[str], active_only: bool) -> dict:
+    query = {}
+    if category:
+        query["category"] = category
+    if active_only:
+        query["is_active"] = True
+    return query
+
+async def render_catalog_page(category: Optional[str], active_only: bool, limit: int, cursor: Optional[str]):
+    """Load one catalog page and encode it once; returns (PrerenderedJSON, next_cursor)"""
+    query = catalog_query(category, active_only)
+
+    # Read the version first so a write racing with this render can only make the ETag older
+    version = await current_catalog_version()
+    try:
+        products, next_cursor = await paginate(db.products, query, PRODUCT_SORT, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    with timed("validate"):
+        products = product_list_adapter.validate_python(products)
+    for product in products:
+        compile_price_table(product)
+    with timed("serialize"):
+        # Compression at the strongest settings is CPU work, keep it off the event loop
+        rendered = await run_in_threadpool(PrerenderedJSON, product_list_adapter.dump_json(products), version)
+    return rendered, next_cursor
+
+def schedule_catalog_warmup(keys: List[Any]) -> None:
+    """Re-render the catalog views that were being served so browsing never waits on a write"""
+    global catalog_warmup_task
+    if not keys:
+        return
+    # A newer write supersedes any warm-up still in flight
+    if catalog_warmup_task is not None and not catalog_warmup_task.done():
+        catalog_warmup_task.cancel()
+    catalog_warmup_task = asyncio.get_running_loop().create_task(warm_catalog(keys[:CATALOG_WARMUP_MAX_VIEWS]))
+
+async def warm_catalog(keys: List[Any]) -> None:
+    for key in keys:
+        try:
+            await catalog_cache.get(key, lambda key=key: render_catalog_page(*key))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Catalog warm-up failed for {key}: {e}")
+
+async def reserve_stock(order_id: str, items: List["CartItem"]) -> Dict[str, int]:
+    """Atomically take stock for every order line, or take nothing and raise 409"""
+    quantities: Dict[str, int] = {}
+    for item in items:
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail=f"Invalid quantity for product {item.product_id}")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        return quantities
     
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to save image: {str(e)}")
+    # Each decrement only applies if enough stock is left; the marker records which ones did
+    marker = f"stock_reservations.{order_id}"
+    result = await db.products.bulk_write([
+        UpdateOne(
+            {"id": product_id, "stock_quantity": {"$gte": quantity}},
+            {"$inc": {"stock_quantity": -quantity}, "$set": {marker: quantity}}
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+    if result.modified_count == len(quantities):
+        return quantities
+    
+    # Partial reservation: find what was taken, give it back and report the short lines
+    products = await db.products.find(
+        {"id": {"$in": list(quantities)}},
+        {"_id": 0, "id": 1, "stock_quantity": 1, marker: 1}
+    ).to_list(len(quantities))
+    reserved = {p["id"] for p in products if order_id in p.get("stock_reservations", {})}
+    await release_stock(order_id, {pid: qty for pid, qty in quantities.items() if pid in reserved})
+    
+    available = {p["id"]: p["stock_quantity"] for p in products}
+    out_of_stock = [
+        {
+            "product_id": product_id,
+            "requested": quantity,
+            # Reserved lines were just released, so add their quantity back
+            "available": available.get(product_id, 0) + (quantity if product_id in reserved else 0)
+        }
+        for product_id, quantity in quantities.items()
+        if product_id not in reserved
+    ]
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": "Insufficient stock", "items": out_of_stock}
+    )
+
+async def release_stock(order_id: str, quantities: Dict[str, int]) -> None:
+    """Return reserved stock for an order"""
+    if not quantities:
+        return
+    marker = f"stock_reservations.{order_id}"
+    await db.products.bulk_write([
+        UpdateOne(
+            {"id": product_id, marker: {"$exists": True}},
+            {"$inc": {"stock_quantity": quantity}, "$unset": {marker: ""}}
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+
+async def confirm_stock(order_id: str, quantities: Dict[str, int]) -> None:
+    """Clear reservation markers once the order is stored"""
+    if not quantities:
+        return
+    await db.products.update_many(
+        {"id": {"$in": list(quantities)}},
+        {"$unset": {f"stock_reservations.{order_id}": ""}}
+    )
+
+async def lookup_image_variants(image_urls: List[str]) -> Dict[str, Dict[str, str]]:
+    """Resized variants for those of the given images that were uploaded here"""
+    local_urls = [url for url in image_urls if url.startswith("/uploads/")]
+    if not local_urls:
+        return {}
+    records = await db.images.find({"url": {"$in": local_urls}}).to_list(len(local_urls))
+    return {record["url"]: record["variants"] for record in records}
+
+async def adjust_image_refs(old_urls: List[str], new_urls: List[str]) -> None:
+    """Move image reference counts from a product's old image list to its new one"""
+    old_urls, new_urls = set(old_urls), set(new_urls)
+    changes = [(url, -1) for url in old_urls - new_urls] + [(url, 1) for url in new_urls - old_urls]
+    changes = [(url, delta) for url, delta in changes if url.startswith("/uploads/")]
+    if changes:
+        await db.images.bulk_write(
+            [UpdateOne({"url": url}, {"$inc": {"ref_count": delta}}) for url, delta in changes],
+            ordered=False
+        )
+
+async def rebuild_search_index():
+    products = await db.products.find().to_list(None)
+    search_index.rebuild(Product(**product) for product in products)
+
+def search_index_expired() -> bool:
+    return time.monotonic() - search_index.built_at > SEARCH_INDEX_TTL
+
+async def refresh_search_index():
+    """Rebuild the search index once it is older than SEARCH_INDEX_TTL"""
+    if not search_index_expired():
+        return
+    async with search_index_lock:
+        # Another request may have rebuilt it while we waited for the lock
+        if search_index_expired():
+            await rebuild_search_index()
+
+async def find_page(collection, query: dict, sort, limit: int, cursor: Optional[str], response: Response) -> List[dict]:
+    """Fetch one keyset page and expose the next cursor in the X-Next-Cursor header"""
+    try:
+        docs, next_cursor = await paginate(collection, query, sort, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return docs
 
 # Initialize sample data
 async def init_sample_data():
@@ -252,9 +586,16 @@ async def init_sample_data():
     from sample_products import EXPANDED_PRODUCT_CATALOG
     
     # Add all products to database
-    for product_data in EXPANDED_PRODUCT_CATALOG:
-        product = Product(**product_data)
+    # One version per product keeps every change log page boundary unambiguous
+    last_version = await next_catalog_version(len(EXPANDED_PRODUCT_CATALOG))
+    first_version = last_version - len(EXPANDED_PRODUCT_CATALOG) + 1
+    for version, product_data in enumerate(EXPANDED_PRODUCT_CATALOG, start=first_version):
+        product = Product(**product_data, version=version)
         await db.products.insert_one(product.dict())
+        await db.catalog_changes.insert_one(
+            {"version": version, "product_id": product.id, "deleted": False, "changed_at": product.updated_at}
+        )
+    catalog_cache.invalidate()
 
 # Admin Authentication Routes
 @admin_router.post("/login", response_model=AdminTokenResponse)
@@ -276,8 +617,12 @@ async def verify_admin_token(admin_user=Depends(get_admin_user)):
 # Admin Product Management Routes
 @admin_router.get("/products", response_model=List[Product])
 async def admin_get_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     active_only: bool = False,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
     admin_user=Depends(get_admin_user)
 ):
     query = {}
@@ -286,20 +631,29 @@ async def admin_get_products(
     if active_only:
         query["is_active"] = True
     
-    products = await db.products.find(query).to_list(1000)
-    return [Product(**product) for product in products]
+    products = await find_page(db.products, query, PRODUCT_SORT, limit, cursor, response)
+    with timed("validate"):
+        products = product_list_adapter.validate_python(products)
+    with timed("serialize"):
+        body = product_list_adapter.dump_json(products)
+    return conditional_json_response(body, request.headers.get("if-none-match"), headers=response.headers)
 
 @admin_router.get("/products/{product_id}", response_model=Product)
-async def admin_get_product(product_id: str, admin_user=Depends(get_admin_user)):
+async def admin_get_product(product_id: str, request: Request, admin_user=Depends(get_admin_user)):
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return product_response(Product(**product), request)
 
 @admin_router.post("/products", response_model=Product)
 async def admin_create_product(product_data: ProductCreate, admin_user=Depends(get_admin_user)):
     product = Product(**product_data.dict())
-    await db.products.insert_one(product.dict())
+    product.image_variants = await lookup_image_variants(product.images)
+    async with catalog_change(product.id) as version:
+        product.version = version
+        await db.products.insert_one(product.dict())
+    await adjust_image_refs([], product.images)
+    await product_changed(product)
     return product
 
 @admin_router.put("/products/{product_id}", response_model=Product)
@@ -310,19 +664,31 @@ async def admin_update_product(
 ):
     update_data = {k: v for k, v in product_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
+    if "images" in update_data:
+        update_data["image_variants"] = await lookup_image_variants(update_data["images"])
+    if not await db.products.find_one({"id": product_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    result = await db.products.update_one({"id": product_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    async with catalog_change(product_id) as version:
+        update_data["version"] = version
+        previous = await db.products.find_one_and_update({"id": product_id}, {"$set": update_data})
+    if previous is None:
+        # Deleted since the check above
         raise HTTPException(status_code=404, detail="Product not found")
+    if "images" in update_data:
+        await adjust_image_refs(previous.get("images", []), update_data["images"])
     
-    updated_product = await db.products.find_one({"id": product_id})
-    return Product(**updated_product)
+    product = Product(**{**previous, **update_data})
+    await product_changed(product)
+    return product
 
 @admin_router.delete("/products/{product_id}")
 async def admin_delete_product(product_id: str, admin_user=Depends(get_admin_user)):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"id": product_id}, {"images": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    await adjust_image_refs(deleted.get("images", []), [])
+    await product_deleted(product_id)
     return {"message": "Product deleted successfully"}
 
 @admin_router.post("/products/{product_id}/toggle-status")
@@ -332,56 +698,181 @@ async def admin_toggle_product_status(product_id: str, admin_user=Depends(get_ad
         raise HTTPException(status_code=404, detail="Product not found")
     
     new_status = not product["is_active"]
-    await db.products.update_one(
-        {"id": product_id}, 
-        {"$set": {"is_active": new_status, "updated_at": datetime.utcnow()}}
-    )
+    async with catalog_change(product_id) as version:
+        changes = {"is_active": new_status, "updated_at": datetime.utcnow(), "version": version}
+        await db.products.update_one({"id": product_id}, {"$set": changes})
+    await product_changed(Product(**{**product, **changes}))
     return {"message": f"Product {'activated' if new_status else 'deactivated'} successfully"}
 
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        "catalog": catalog_cache.stats(),
+        "stats": stats_cache.stats(),
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats()
+    }
+
+metrics_registry.add_collector(cache_collector(cache_stats))
+
+@admin_router.get("/cache/stats")
+async def admin_get_cache_stats(admin_user=Depends(get_admin_user)):
+    return cache_stats()
+
+@admin_router.get("/compression/stats")
+async def admin_get_compression_stats(admin_user=Depends(get_admin_user)):
+    return compression_stats.snapshot()
+
+@admin_router.get("/profiles")
+async def admin_list_profiles(admin_user=Depends(get_admin_user)):
+    return {"settings": profiler.settings(), "profiles": await run_in_threadpool(profiler.store.list)}
+
+@admin_router.put("/profiles/settings")
+async def admin_update_profiling(settings: ProfilingSettingsUpdate, admin_user=Depends(get_admin_user)):
+    # Applies to this worker only
+    profiler.sample_rate = settings.sample_rate
+    return profiler.settings()
+
+@admin_router.get("/profiles/{name}")
+async def admin_download_profile(name: str, admin_user=Depends(get_admin_user)):
+    path = await run_in_threadpool(profiler.store.path_for, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+async def record_image(image_url: str, created: bool) -> Dict[str, str]:
+    """Register an upload and its variants; identical re-uploads reuse the existing variants"""
+    existing = None if created else await db.images.find_one({"url": image_url})
+    variants = existing["variants"] if existing and existing.get("variants") else await generate_variants(image_url)
+    # updated_at doubles as the orphan grace-period clock for garbage collection
+    await db.images.update_one(
+        {"url": image_url},
+        {
+            "$set": {"variants": variants, "updated_at": datetime.utcnow()},
+            "$setOnInsert": {"ref_count": 0, "created_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+    return variants
+
+# The body is parsed by save_multipart_upload as it arrives, so describe it for the API docs by hand
+@admin_router.post("/images", openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {
+    "schema": {"type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}
+}}}})
+async def admin_upload_image_file(request: Request, admin_user=Depends(get_admin_user)):
+    image_url, created = await save_multipart_upload(request)
+    variants = await record_image(image_url, created)
+    return {
+        "image_url": image_url,
+        "variants": variants,
+        "deduplicated": not created,
+        "message": "Image uploaded successfully"
+    }
+
+@admin_router.post("/images/gc")
+async def admin_collect_orphan_images(
+    batch_size: int = Query(100, ge=1, le=1000),
+    grace_hours: float = Query(24, ge=0),
+    admin_user=Depends(get_admin_user)
+):
+    # Fresh uploads are unreferenced until a product is saved with them, hence the grace period
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    orphans = await db.images.find(
+        {"ref_count": {"$lte": 0}, "updated_at": {"$lt": cutoff}},
+        {"url": 1}
+    ).limit(batch_size).to_list(batch_size)
+    urls = [orphan["url"] for orphan in orphans]
+    if not urls:
+        return {"deleted": 0, "remaining": False}
+    
+    # Re-check the count and age so an image referenced or re-uploaded in the meantime survives
+    result = await db.images.delete_many(
+        {"url": {"$in": urls}, "ref_count": {"$lte": 0}, "updated_at": {"$lt": cutoff}}
+    )
+    still_referenced = await db.images.find({"url": {"$in": urls}}, {"url": 1}).to_list(len(urls))
+    kept = {record["url"] for record in still_referenced}
+    for url in urls:
+        if url not in kept:
+            await delete_image_files(url)
+    return {"deleted": result.deleted_count, "remaining": len(urls) == batch_size}
+
+# Compatibility route for clients still sending base64 JSON; prefer POST /images
 @admin_router.post("/upload-image")
 async def admin_upload_image(image_data: ImageUpload, admin_user=Depends(get_admin_user)):
     try:
-        image_url = save_base64_image(image_data.image_data, image_data.filename)
-        return {"image_url": image_url, "message": "Image uploaded successfully"}
+        image_url, created = await save_base64_image(image_data.image_data, image_data.filename)
+        variants = await record_image(image_url, created)
+        return {"image_url": image_url, "variants": variants, "message": "Image uploaded successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Admin Dashboard Stats
 @admin_router.get("/stats")
 async def admin_get_stats(admin_user=Depends(get_admin_user)):
-    total_products = await db.products.count_documents({})
-    active_products = await db.products.count_documents({"is_active": True})
-    total_orders = await db.orders.count_documents({})
-    total_users = await db.users.count_documents({})
+    return await stats_cache.get("dashboard", load_dashboard_stats)
+
+async def load_dashboard_stats():
+    low_stock = {"$expr": {"$lte": ["$stock_quantity", "$min_stock_level"]}}
     
-    # Low stock products
-    low_stock_products = await db.products.find({
-        "$expr": {"$lte": ["$stock_quantity", "$min_stock_level"]}
-    }).to_list(100)
+    # Every product counter plus the low-stock list in a single aggregation
+    product_stats = db.products.aggregate([
+        {"$facet": {
+            "counts": [
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "active": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}}
+                }}
+            ],
+            "low_stock_count": [{"$match": low_stock}, {"$count": "count"}],
+            "low_stock_items": [
+                {"$match": low_stock},
+                {"$sort": {"stock_quantity": 1}},
+                {"$limit": 100},
+                {"$project": {
+                    "_id": 0, "id": 1, "name": 1, "category": 1, "subcategory": 1,
+                    "stock_quantity": 1, "min_stock_level": 1, "is_active": 1
+                }}
+            ]
+        }}
+    ]).to_list(1)
+    
+    # Collection totals come from metadata and run concurrently with the aggregation
+    facets, total_orders, total_users = await asyncio.gather(
+        product_stats,
+        db.orders.estimated_document_count(),
+        db.users.estimated_document_count()
+    )
+    facets = facets[0]
+    counts = facets["counts"][0] if facets["counts"] else {"total": 0, "active": 0}
+    low_stock_count = facets["low_stock_count"][0]["count"] if facets["low_stock_count"] else 0
     
     return {
-        "total_products": total_products,
-        "active_products": active_products,
-        "inactive_products": total_products - active_products,
+        "total_products": counts["total"],
+        "active_products": counts["active"],
+        "inactive_products": counts["total"] - counts["active"],
         "total_orders": total_orders,
         "total_users": total_users,
-        "low_stock_products": len(low_stock_products),
-        "low_stock_items": [Product(**product) for product in low_stock_products]
+        "low_stock_products": low_stock_count,
+        "low_stock_items": facets["low_stock_items"]
     }
 
 # Admin Order Management
 @admin_router.get("/orders")
 async def admin_get_orders(
+    response: Response,
     status: Optional[str] = None,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
     admin_user=Depends(get_admin_user)
 ):
     query = {}
     if status:
         query["order_status"] = status
     
-    orders = await db.orders.find(query).sort("order_date", -1).limit(limit).to_list(limit)
-    return [Order(**order) for order in orders]
+    orders = await find_page(db.orders, query, ORDER_SORT, limit, cursor, response)
+    return validated_list_response(order_list_adapter, orders, response.headers)
 
 @admin_router.put("/orders/{order_id}/status")
 async def admin_update_order_status(
@@ -407,46 +898,139 @@ async def admin_update_order_status(
 
 # Product routes
 @api_router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None, active_only: bool = True):
-    query = {}
-    if category:
-        query["category"] = category
-    if active_only:
-        query["is_active"] = True
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = Query(CATALOG_PAGE_LIMIT, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    if cursor is None and limit == CATALOG_PAGE_LIMIT and category in CATALOG_CACHED_CATEGORIES:
+        key = (category, active_only, limit, cursor)
+        rendered, next_cursor = await catalog_cache.get(key, lambda: render_catalog_page(*key))
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return rendered.response(
+            request.headers.get("accept-encoding"),
+            request.headers.get("if-none-match"),
+            headers
+        )
+
+    # Any other view is rendered per request, without the pre-compression the cached pages get
+    products = await find_page(db.products, catalog_query(category, active_only), PRODUCT_SORT, limit, cursor, response)
+    with timed("validate"):
+        products = product_list_adapter.validate_python(products)
+    with timed("serialize"):
+        body = product_list_adapter.dump_json(products)
+    return conditional_json_response(body, request.headers.get("if-none-match"), headers=response.headers)
+
+@api_router.get("/products/changes", response_model=CatalogChangesResponse)
+async def get_product_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=1000)
+):
+    """Products created, updated or deleted after catalog version `since`"""
+    version = await current_catalog_version()
+    if since == 0 or since > version:
+        # First sync, or a version from another database: send everything. The snapshot's
+        # version stops short of writes still in flight, which are read before the products.
+        window_start = max(version - CATALOG_PENDING_WINDOW, 0)
+        settled, _ = await logged_changes(window_start, CATALOG_PENDING_WINDOW)
+        version = settled[-1]["version"] if settled else window_start
+        products = await db.products.find().sort(PRODUCT_SORT).to_list(None)
+        return CatalogChangesResponse(
+            version=version,
+            products=product_list_adapter.validate_python(products),
+            deleted=[],
+            reset=True
+        )
+    
+    changes, has_more = await logged_changes(since, limit)
     
-    products = await db.products.find(query).to_list(1000)
-    return [Product(**product) for product in products]
+    # Only the latest change per product matters to the client
+    latest = {change["product_id"]: change for change in changes}
+    changed_ids = [product_id for product_id, change in latest.items() if not change["deleted"]]
+    products = await db.products.find({"id": {"$in": changed_ids}}).to_list(None) if changed_ids else []
+    found = {product["id"] for product in products}
+    # A product deleted after the last change on this page is already gone
+    deleted = [product_id for product_id, change in latest.items() if change["deleted"] or product_id not in found]
+    return CatalogChangesResponse(
+        # Not the counter: writes that bumped it may not have logged their change yet
+        version=changes[-1]["version"] if changes else since,
+        products=product_list_adapter.validate_python(products),
+        deleted=deleted,
+        has_more=has_more
+    )
+
+@api_router.get("/products/search", response_model=ProductSearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    # Pick up writes made by other workers
+    await refresh_search_index()
+    
+    def visible(product: Product) -> bool:
+        return product.is_active and (category is None or product.category == category)
+    
+    results, total = search_index.search(q, limit=limit, offset=offset, predicate=visible)
+    next_offset = offset + limit if offset + limit < total else None
+    return ProductSearchResponse(
+        query=q,
+        total=total,
+        items=[product for product, _ in results],
+        next_offset=next_offset
+    )
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return product_response(Product(**product), request)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate):
     product = Product(**product_data.dict())
-    await db.products.insert_one(product.dict())
+    product.image_variants = await lookup_image_variants(product.images)
+    async with catalog_change(product.id) as version:
+        product.version = version
+        await db.products.insert_one(product.dict())
+    await adjust_image_refs([], product.images)
+    await product_changed(product)
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_update: ProductUpdate):
     update_data = {k: v for k, v in product_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
+    if "images" in update_data:
+        update_data["image_variants"] = await lookup_image_variants(update_data["images"])
+    if not await db.products.find_one({"id": product_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
-    updated_product = await db.products.find_one({"id": product_id})
-    
-    if not updated_product:
+    async with catalog_change(product_id) as version:
+        update_data["version"] = version
+        previous = await db.products.find_one_and_update({"id": product_id}, {"$set": update_data})
+    if previous is None:
+        # Deleted since the check above
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**updated_product)
+    if "images" in update_data:
+        await adjust_image_refs(previous.get("images", []), update_data["images"])
+    
+    product = Product(**{**previous, **update_data})
+    await product_changed(product)
+    return product
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"id": product_id}, {"images": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    await adjust_image_refs(deleted.get("images", []), [])
+    await product_deleted(product_id)
     return {"message": "Product deleted successfully"}
 
 # Cart routes (guest cart calculation)
@@ -455,22 +1039,30 @@ async def calculate_cart(items: List[CartItem]):
     total = 0.0
     calculated_items = []
     
+    # Fetch every referenced product in one round trip
+    product_ids = list(dict.fromkeys(item.product_id for item in items))
+    products = await db.products.find({"id": {"$in": product_ids}}).to_list(len(product_ids))
+    products_by_id = {product["id"]: product for product in products}
+    
     for item in items:
-        # Get product details
-        product = await db.products.find_one({"id": item.product_id})
+        product = products_by_id.get(item.product_id)
         if not product:
             raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
         
-        product_obj = Product(**product)
-        item_price = product_obj.base_price
+        price_table = get_price_table(product)
+        item_price = float(product["base_price"])
         
         # Calculate customization price
         for category, option in item.customizations.items():
-            if category in product_obj.customization_options:
-                for opt in product_obj.customization_options[category].options:
-                    if opt.name == option:
-                        item_price += opt.price_modifier
-                        break
+            options = price_table.get(category)
+            if options is None:
+                continue
+            if option not in options:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid option '{option}' for {category} on product {item.product_id}"
+                )
+            item_price += options[option]
         
         calculated_price = item_price * item.quantity
         calculated_item = CartItem(
@@ -491,68 +1083,49 @@ async def request_otp(otp_request: OTPRequest):
         raise HTTPException(status_code=400, detail="Either email or phone is required")
     
     otp = generate_otp()
-    
-    # Store OTP in database (in production, use Redis for better performance)
-    otp_data = {
-        "otp": otp,
-        "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(minutes=10),
-        "verified": False
-    }
+    identity = {}
     
     if otp_request.email:
-        otp_data["email"] = otp_request.email
+        identity["email"] = otp_request.email
         # TODO: Send email OTP (implement with actual email service)
         logger.info(f"OTP for email {otp_request.email}: {otp}")
     
     if otp_request.phone:
-        otp_data["phone"] = otp_request.phone
+        identity["phone"] = otp_request.phone
         # TODO: Send SMS OTP (implement with actual SMS service)
         logger.info(f"OTP for phone {otp_request.phone}: {otp}")
     
-    await db.otp_codes.insert_one(otp_data)
+    # A new code replaces any earlier one for the same email/phone
+    await otp_store.save(identity, otp, OTP_TTL)
     
     return {"message": "OTP sent successfully", "otp": otp}  # Remove otp in production
 
 @api_router.post("/auth/verify-otp")
 async def verify_otp(otp_verify: OTPVerify):
-    query = {"otp": otp_verify.otp, "verified": False}
-    
-    if otp_verify.email:
-        query["email"] = otp_verify.email
-    if otp_verify.phone:
-        query["phone"] = otp_verify.phone
-    
-    otp_record = await db.otp_codes.find_one(query)
-    
-    if not otp_record or otp_record["expires_at"] < datetime.utcnow():
-        raise HTTPException(status_code=400, detail="Invalid or expired OTP")
-    
-    # Mark OTP as verified
-    await db.otp_codes.update_one({"_id": otp_record["_id"]}, {"$set": {"verified": True}})
+    if not otp_verify.email and not otp_verify.phone:
+        raise HTTPException(status_code=400, detail="Either email or phone is required")
     
-    # Check if user exists or create new user
     user_query = {}
     if otp_verify.email:
         user_query["email"] = otp_verify.email
     if otp_verify.phone:
         user_query["phone"] = otp_verify.phone
     
-    user = await db.users.find_one(user_query)
+    # Consume the OTP atomically so the same code cannot be redeemed twice
+    if not await otp_store.consume(user_query, otp_verify.otp):
+        raise HTTPException(status_code=400, detail="Invalid or expired OTP")
     
-    if not user:
-        # Create new user
-        user_data = {
-            "name": "New User",  # Will be updated during profile completion
-        }
-        if otp_verify.email:
-            user_data["email"] = otp_verify.email
-        if otp_verify.phone:
-            user_data["phone"] = otp_verify.phone
-        
-        new_user = User(**user_data)
-        await db.users.insert_one(new_user.dict())
-        user = new_user.dict()
+    # Fetch the user, creating it on first login, in one round trip
+    new_user = User(
+        name="New User",  # Will be updated during profile completion
+        **user_query
+    ).dict()
+    user = await db.users.find_one_and_update(
+        user_query,
+        {"$setOnInsert": {k: v for k, v in new_user.items() if k not in user_query}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     
     # Create JWT token
     access_token = create_access_token(data={"sub": user["id"]})
@@ -578,7 +1151,9 @@ async def update_user_profile(
     await db.users.update_one({"id": current_user.id}, {"$set": user_update})
     updated_user = await db.users.find_one({"id": current_user.id})
     
-    return User(**updated_user)
+    user = User(**updated_user)
+    user_cache.set(current_user.id, user)
+    return user
 
 # Order routes
 @api_router.post("/orders", response_model=Order)
@@ -594,13 +1169,25 @@ async def create_order(
         payment_method=order_data.payment_method
     )
     
-    await db.orders.insert_one(order.dict())
+    reserved = await reserve_stock(order.id, order.items)
+    try:
+        await db.orders.insert_one(order.dict())
+    except Exception:
+        await release_stock(order.id, reserved)
+        raise
+    await confirm_stock(order.id, reserved)
     return order
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_user_orders(current_user: User = Depends(get_current_user)):
-    orders = await db.orders.find({"user_id": current_user.id}).to_list(1000)
-    return [Order(**order) for order in orders]
+async def get_user_orders(
+    response: Response,
+    # The storefront reads one page, so the default covers the whole history as before
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    orders = await find_page(db.orders, {"user_id": current_user.id}, ORDER_SORT, limit, cursor, response)
+    return validated_list_response(order_list_adapter, orders, response.headers)
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(
@@ -612,20 +1199,6 @@ async def get_order(
         raise HTTPException(status_code=404, detail="Order not found")
     return Order(**order)
 
-# Admin routes (simplified for MVP)
-@api_router.get("/admin/orders", response_model=List[Order])
-async def get_all_orders():
-    orders = await db.orders.find().to_list(1000)
-    return [Order(**orders) for order in orders]
-
-@api_router.put("/admin/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: dict):
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"order_status": status["order_status"], "updated_at": datetime.utcnow()}}
-    )
-    return {"message": "Order status updated"}
-
 # Basic routes
 @api_router.get("/")
 async def root():
@@ -635,6 +1208,20 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    # Scrapers authenticate with a static bearer token when METRICS_TOKEN is set
+    metrics_token = os.environ.get("METRICS_TOKEN")
+    if metrics_token and request.headers.get("authorization") != f"Bearer {metrics_token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+# Uploaded images
+@app.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"])
+async def get_upload(file_path: str, request: Request):
+    return await serve_upload(file_path, request)
+
 # Include the routers in the main app
 app.include_router(api_router)
 app.include_router(admin_router)
@@ -645,7 +1232,14 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges", "X-Profile-Id"],
 )
+app.add_middleware(ProfilingMiddleware, profiler=profiler, authorize=lambda token: admin_token_username(token) is not None)
+app.add_middleware(CompressionMiddleware, stats=compression_stats)
+# Outside compression, so total includes encoding the body
+app.add_middleware(ServerTimingMiddleware)
+# Outermost, so latency and sizes include compression and CORS
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -656,10 +1250,16 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes(db, logger)
+    
     # Initialize sample data
     await init_sample_data()
     logger.info("Sample data initialized")
+    
+    await rebuild_search_index()
+    logger.info(f"Search index built with {len(search_index)} products")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    shutdown_image_pool()
     client.close()
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for list endpoint serialization.
+
+Compares the original handler style (build Product(**doc) per document and let
+FastAPI re-validate and encode through response_model) with the bulk
+TypeAdapter + FastJSONResponse path, for a 1,000-product catalog. Requests go
+straight through the ASGI app, so no server or MongoDB is needed.
+
+    python backend_benchmark.py [--items 1000] [--rounds 30]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi import FastAPI  # noqa: E402
+
+import server  # noqa: E402
+from sample_products import EXPANDED_PRODUCT_CATALOG  # noqa: E402
+from serialization import validated_list_response  # noqa: E402
+
+
+def build_docs(count: int) -> List[dict]:
+    docs = []
+    while len(docs) < count:
+        for product_data in EXPANDED_PRODUCT_CATALOG:
+            if len(docs) == count:
+                break
+            docs.append(server.Product(**product_data).dict())
+    return docs
+
+
+def build_app(docs: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before", response_model=List[server.Product])
+    async def before():
+        return [server.Product(**doc) for doc in docs]
+
+    @app.get("/after", response_model=List[server.Product])
+    async def after():
+        return validated_list_response(server.product_list_adapter, docs)
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    """Run one GET through the ASGI app and return the response body"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def time_route(app: FastAPI, path: str, rounds: int) -> float:
+    await call(app, path)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await call(app, path)
+    return (time.perf_counter() - started) / rounds
+
+
+async def main(items: int, rounds: int) -> dict:
+    docs = build_docs(items)
+    app = build_app(docs)
+
+    before_body = await call(app, "/before")
+    after_body = await call(app, "/after")
+    assert json.loads(before_body) == json.loads(after_body), "serialization paths disagree"
+
+    results = {"items": items, "rounds": rounds}
+    for name in ("before", "after"):
+        seconds = await time_route(app, f"/{name}", rounds)
+        results[name] = {
+            "ms_per_request": round(seconds * 1000, 3),
+            "us_per_item": round(seconds * 1e6 / items, 3),
+        }
+    results["speedup"] = round(results["before"]["ms_per_request"] / results["after"]["ms_per_request"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=30)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.items, args.rounds)), indent=2))
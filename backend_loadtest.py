@@ -0,0 +1,309 @@
+"""
+Load generator simulating a dinner rush.
+
+Drives an open-loop mix of customer and admin traffic at a target request
+rate and prints throughput and per-endpoint p50/p95/p99 latency as JSON, so
+runs can be compared between commits. The traffic mix is browse, cart
+calculation, OTP login, order placement and admin order-status updates.
+
+Order-status updates go to PUT /api/admin/orders/{id}/status, the same call
+the admin dashboard makes, so they include the admin token check and status
+validation.
+
+By default the FastAPI app is booted in-process on an in-memory MongoDB
+stand-in (mongomock-motor), so no server or database is needed. The stand-in
+answers without network or disk I/O, so use those numbers to compare
+application overhead, not to size a deployment. Use --mongo-url to run the
+in-process app against a real MongoDB, or --base-url to load a running
+server.
+
+    python backend_loadtest.py [--rps 50] [--duration 30] [--mix browse=50,cart=20,login=10,order=15,admin_status=5]
+    python backend_loadtest.py --base-url http://localhost:8001 --rps 200 --output rush.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+DEFAULT_MIX = {"browse": 50, "cart": 20, "login": 10, "order": 15, "admin_status": 5}
+ADMIN_CREDENTIALS = {"username": "admin", "password": "cloudskitchen123"}
+ORDER_STATUSES = ["confirmed", "preparing", "ready", "dispatched", "delivered"]
+DELIVERY_ADDRESS = {"name": "Load Test", "address": "1 Rush Lane", "city": "Bengaluru", "pincode": "560001"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Latency and status counts per logical endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Counter] = {}
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response = None
+            status = type(e).__name__
+        self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        self.statuses.setdefault(name, Counter())[status] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            statuses = self.statuses[name]
+            endpoints[name] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                # 4xx are expected business outcomes (e.g. 409 out of stock); 5xx and transport errors are not
+                "errors": sum(count for status, count in statuses.items() if not status.isdigit() or status >= "500"),
+                "statuses": dict(statuses),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "mean_ms": round(sum(values) / len(values), 2),
+                "max_ms": round(values[-1], 2),
+            }
+        return endpoints
+
+
+class Rush:
+    """The customer and admin actions that make up the traffic mix"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder):
+        self.client = client
+        self.recorder = recorder
+        self.products: List[Dict[str, Any]] = []
+        self.admin_headers: Dict[str, str] = {}
+        self.user_tokens: deque = deque(maxlen=200)
+        self.recent_orders: deque = deque(maxlen=500)
+
+    async def setup(self, users: int) -> None:
+        response = await self.client.post("/api/admin/login", json=ADMIN_CREDENTIALS)
+        response.raise_for_status()
+        self.admin_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        response = await self.client.get("/api/products", params={"limit": 1000})
+        response.raise_for_status()
+        self.products = [product for product in response.json() if product["is_active"]]
+        if not self.products:
+            raise RuntimeError("No active products to order")
+
+        for _ in range(users):
+            token = await self.login(record=False)
+            if token:
+                self.user_tokens.append(token)
+        if not self.user_tokens:
+            raise RuntimeError("OTP login failed during setup")
+
+    def cart_items(self) -> List[Dict[str, Any]]:
+        items = []
+        for product in random.sample(self.products, k=min(random.randint(1, 3), len(self.products))):
+            items.append({
+                "product_id": product["id"],
+                "quantity": 1,
+                "customizations": {},
+                "calculated_price": product["base_price"],
+            })
+        return items
+
+    async def browse(self) -> None:
+        if random.random() < 0.7:
+            await self.recorder.call(self.client, "GET /api/products", "GET", "/api/products")
+        else:
+            product = random.choice(self.products)
+            await self.recorder.call(self.client, "GET /api/products/{id}", "GET", f"/api/products/{product['id']}")
+
+    async def cart(self) -> None:
+        await self.recorder.call(self.client, "POST /api/cart/calculate", "POST", "/api/cart/calculate", json=self.cart_items())
+
+    async def login(self, record: bool = True) -> Optional[str]:
+        phone = f"9{random.randint(0, 999_999_999):09d}"
+        request = self.recorder.call if record else self._unrecorded
+        response = await request(self.client, "POST /api/auth/request-otp", "POST", "/api/auth/request-otp", json={"phone": phone})
+        if response is None or response.status_code != 200:
+            return None
+        otp = response.json()["otp"]
+        response = await request(
+            self.client, "POST /api/auth/verify-otp", "POST", "/api/auth/verify-otp", json={"phone": phone, "otp": otp}
+        )
+        if response is None or response.status_code != 200:
+            return None
+        token = response.json()["access_token"]
+        if record:
+            self.user_tokens.append(token)
+        return token
+
+    async def order(self) -> None:
+        items = self.cart_items()
+        response = await self.recorder.call(
+            self.client, "POST /api/orders", "POST", "/api/orders",
+            json={"items": items, "delivery_address": DELIVERY_ADDRESS, "payment_method": "cod"},
+            headers={"Authorization": f"Bearer {random.choice(self.user_tokens)}"},
+        )
+        if response is not None and response.status_code == 200:
+            self.recent_orders.append(response.json()["id"])
+
+    async def admin_status(self) -> None:
+        if not self.recent_orders:
+            await self.order()
+            return
+        order_id = random.choice(self.recent_orders)
+        await self.recorder.call(
+            self.client, "PUT /api/admin/orders/{id}/status", "PUT", f"/api/admin/orders/{order_id}/status",
+            json={"order_status": random.choice(ORDER_STATUSES)},
+            headers=self.admin_headers,
+        )
+
+    @staticmethod
+    async def _unrecorded(client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        return await client.request(method, url, **kwargs)
+
+
+async def drive(rush: Rush, mix: Dict[str, int], rps: float, duration: float, max_in_flight: int) -> Dict[str, Any]:
+    """Start one action every 1/rps seconds regardless of how fast earlier ones finish"""
+    actions = list(mix)
+    weights = [mix[action] for action in actions]
+    in_flight = set()
+    started_actions: Counter = Counter()
+    dropped = 0
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    total = int(rps * duration)
+    for i in range(total):
+        delay = started + i / rps - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # The app is not keeping up; count it rather than queueing without bound
+            dropped += 1
+            continue
+        action = random.choices(actions, weights)[0]
+        started_actions[action] += 1
+        task = asyncio.create_task(getattr(rush, action)())
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.wait(in_flight)
+    return {"elapsed": loop.time() - started, "actions": dict(started_actions), "dropped": dropped}
+
+
+@asynccontextmanager
+async def app_client(base_url: Optional[str], mongo_url: Optional[str]) -> AsyncIterator[httpx.AsyncClient]:
+    timeout = httpx.Timeout(30.0)
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            yield client
+        return
+
+    sys.path.insert(0, str(Path(__file__).parent / "backend"))
+    os.environ["MONGO_URL"] = mongo_url or "mongodb://localhost:27017"
+    os.environ.setdefault("DB_NAME", "loadtest")
+    import server
+    from otp_store import create_otp_store
+
+    if mongo_url is None:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("In-process runs need mongomock-motor (pip install mongomock-motor) or --mongo-url")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[os.environ["DB_NAME"]]
+        server.otp_store = create_otp_store(os.environ.get("OTP_STORE", "mongo"), server.db)
+
+    # Keep per-request access and OTP log lines from drowning the report
+    logging.getLogger().setLevel(logging.WARNING)
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            yield client
+    finally:
+        await server.app.router.shutdown()
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        action, _, weight = part.partition("=")
+        action = action.strip()
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action '{action}', expected one of {', '.join(DEFAULT_MIX)}")
+        mix[action] = int(weight)
+    return mix
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    random.seed(args.seed)
+    recorder = Recorder()
+    async with app_client(args.base_url, args.mongo_url) as client:
+        rush = Rush(client, recorder)
+        await rush.setup(args.users)
+        cpu_started = time.process_time()
+        run = await drive(rush, args.mix, args.rps, args.duration, args.max_in_flight)
+        cpu_seconds = time.process_time() - cpu_started
+
+    endpoints = recorder.report(run["elapsed"])
+    requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "config": {
+            "target": args.base_url or ("in-process, " + ("mongodb" if args.mongo_url else "mongomock")),
+            "rps": args.rps,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "max_in_flight": args.max_in_flight,
+            "seed": args.seed,
+        },
+        "elapsed_s": round(run["elapsed"], 3),
+        "requests": requests,
+        "throughput_rps": round(requests / run["elapsed"], 2),
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "dropped": run["dropped"],
+        "actions": run["actions"],
+        # Load generator and app share the process when in-process, so this covers both
+        "cpu_seconds": round(cpu_seconds, 3),
+        "endpoints": endpoints,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", help="Load a running server instead of booting the app in-process")
+    parser.add_argument("--mongo-url", help="Run the in-process app against this MongoDB instead of mongomock")
+    parser.add_argument("--rps", type=float, default=50, help="Actions started per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load for")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Action weights, e.g. browse=50,order=15")
+    parser.add_argument("--users", type=int, default=20, help="Customers logged in before the rush")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="Actions allowed to run at once")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
@@ -101,6 +101,11 @@ class CloudsKitchenAPITester:
             self.run_test("Get Vegetarian Products", "GET", "products", 200, data={"category": "vegetarian"})
             self.run_test("Get Vegan Products", "GET", "products", 200, data={"category": "vegan"})
             
+            # Test server-side search
+            success_search, search_results = self.run_test("Search Products", "GET", "products/search", 200, data={"q": "paneer"})
+            if success_search:
+                print(f"   Search matched {search_results.get('total', 0)} products")
+            
             # Test individual product
             if self.product_id:
                 self.run_test("Get Single Product", "GET", f"products/{self.product_id}", 200)
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+
+def add_product(server, name):
+    """Insert a product with its own logged catalog version, the way the create routes do"""
+    async def create():
+        product = server.Product(
+            name=name, description=name, images=[], category="vegan", subcategory="snacks", base_price=100
+        )
+        async with server.catalog_change(product.id) as version:
+            product.version = version
+            await server.db.products.insert_one(product.dict())
+        return product
+    return asyncio.run(create())
+
+
+def changes(server, since):
+    return asyncio.run(server.get_product_changes(since=since, limit=200))
+
+
+def age_change(server, version):
+    asyncio.run(server.db.catalog_changes.update_one(
+        {"version": version},
+        {"$set": {"changed_at": datetime.utcnow() - server.CATALOG_CHANGE_GRACE - timedelta(seconds=1)}}
+    ))
+
+
+def test_sync_returns_changes_after_since(server):
+    first = add_product(server, "Samosa")
+    second = add_product(server, "Dosa")
+
+    response = changes(server, since=first.version)
+    assert response.version == second.version
+    assert [product.id for product in response.products] == [second.id]
+    assert response.deleted == []
+    assert not response.reset
+
+
+def test_sync_stops_at_a_recent_gap(server):
+    first = add_product(server, "Samosa")
+    # A write that has reserved its version but not logged it yet
+    asyncio.run(server.next_catalog_version())
+    later = add_product(server, "Dosa")
+
+    response = changes(server, since=first.version)
+    assert response.version == first.version
+    assert response.products == []
+
+    # Once the row after the gap is older than the grace window, the gap counts as abandoned
+    age_change(server, later.version)
+    response = changes(server, since=first.version)
+    assert response.version == later.version
+    assert [product.id for product in response.products] == [later.id]
+
+
+def test_snapshot_version_stops_before_a_pending_write(server):
+    first = add_product(server, "Samosa")
+    asyncio.run(server.next_catalog_version())
+    add_product(server, "Dosa")
+
+    response = changes(server, since=0)
+    assert response.reset
+    assert response.version == first.version
+    assert len(response.products) == 2
+
+
+def test_delete_leaves_a_tombstone(server):
+    product = add_product(server, "Samosa")
+    asyncio.run(server.delete_product(product.id))
+
+    response = changes(server, since=product.version)
+    assert response.version == product.version + 1
+    assert response.deleted == [product.id]
+    assert response.products == []
+
+
+def test_failed_update_does_not_use_a_version(server):
+    add_product(server, "Samosa")
+    before = asyncio.run(server.current_catalog_version())
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.update_product("missing", server.ProductUpdate(name="Vada")))
+    assert excinfo.value.status_code == 404
+    assert asyncio.run(server.current_catalog_version()) == before
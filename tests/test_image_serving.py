@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+
+from image_serving import parse_range
+from serialization import etag_matches
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_parse_range_satisfiable(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=-",
+    "bytes=0-99,200-299",
+    "items=0-99",
+    "bytes=abc-",
+    "bytes=99-0",
+])
+def test_parse_range_ignores_malformed_and_multi_range(header):
+    assert parse_range(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_range(header, SIZE)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+def test_parse_range_empty_file():
+    with pytest.raises(HTTPException) as excinfo:
+        parse_range("bytes=0-", 0)
+    assert excinfo.value.status_code == 416
+
+
+@pytest.mark.parametrize("if_none_match, etag, expected", [
+    ('"abc"', '"abc"', True),
+    ('"xyz", "abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),
+    ('"abc"', 'W/"abc"', True),
+    ("*", '"abc"', True),
+    ('"abcd"', '"abc"', False),
+    ('"xyz"', '"abc"', False),
+    ("", '"abc"', False),
+    (None, '"abc"', False),
+])
+def test_etag_matches(if_none_match, etag, expected):
+    assert etag_matches(if_none_match, etag) is expected
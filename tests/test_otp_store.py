@@ -0,0 +1,81 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import otp_store
+from otp_store import MemoryOTPStore, MongoOTPStore, OTPStore, create_otp_store
+
+PHONE = {"phone": "9876543210"}
+TTL = timedelta(minutes=10)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(otp_store.time, "monotonic", clock)
+    return clock
+
+
+def test_otp_store_is_abstract():
+    with pytest.raises(TypeError):
+        OTPStore()
+
+
+def test_code_is_consumed_once(clock):
+    store = MemoryOTPStore()
+    asyncio.run(store.save(PHONE, "123456", TTL))
+
+    assert asyncio.run(store.consume(PHONE, "000000")) is False
+    assert asyncio.run(store.consume({"phone": "9999999999"}, "123456")) is False
+    assert asyncio.run(store.consume(PHONE, "123456")) is True
+    assert asyncio.run(store.consume(PHONE, "123456")) is False
+    assert len(store) == 0
+
+
+def test_expired_code_is_rejected(clock):
+    store = MemoryOTPStore()
+    asyncio.run(store.save(PHONE, "123456", TTL))
+
+    clock.now += TTL.total_seconds()
+    assert asyncio.run(store.consume(PHONE, "123456")) is False
+
+
+def test_new_code_replaces_the_previous_one(clock):
+    store = MemoryOTPStore()
+    asyncio.run(store.save(PHONE, "111111", TTL))
+    clock.now += 300
+    asyncio.run(store.save(PHONE, "222222", TTL))
+
+    assert len(store) == 1
+    assert asyncio.run(store.consume(PHONE, "111111")) is False
+    # The first code's expiry must not take the replacement with it
+    clock.now += 400
+    asyncio.run(store.save({"email": "cook@example.com"}, "333333", TTL))
+    assert asyncio.run(store.consume(PHONE, "222222")) is True
+
+
+def test_expired_codes_are_purged(clock):
+    store = MemoryOTPStore()
+    for i in range(5):
+        asyncio.run(store.save({"phone": f"90000000{i:02d}"}, "123456", TTL))
+    assert len(store) == 5
+
+    clock.now += TTL.total_seconds() + 1
+    asyncio.run(store.save(PHONE, "654321", TTL))
+    assert len(store) == 1
+
+
+def test_create_otp_store():
+    assert isinstance(create_otp_store("memory", db=None), MemoryOTPStore)
+    assert isinstance(create_otp_store("mongo", db=object()), MongoOTPStore)
+    with pytest.raises(ValueError):
+        create_otp_store("redis", db=None)
@@ -0,0 +1,71 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from pagination import (
+    ORDER_SORT, PRODUCT_SORT, InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+)
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    order_date = datetime(2024, 5, 1, 19, 30, 15, 250000)
+    cursor = encode_cursor([order_date, "order-1"])
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, ORDER_SORT) == [order_date, "order-1"]
+    assert decode_cursor(encode_cursor(["Masala Dosa", "p-1"]), PRODUCT_SORT) == ["Masala Dosa", "p-1"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    raw_cursor({"name": "Samosa"}),
+    raw_cursor(["Samosa"]),
+    raw_cursor(["Samosa", "p-1", "extra"]),
+])
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, PRODUCT_SORT)
+
+
+@pytest.mark.parametrize("values", [
+    [{"$ne": None}, ""],
+    [{"$regex": "^A"}, ""],
+    [{"$date": "2024-05-01T00:00:00", "$ne": None}, ""],
+    [None, "p-1"],
+    [True, "p-1"],
+    [["Samosa"], "p-1"],
+    [{"$date": "2024-05-01T00:00:00"}, "p-1"],
+    ["Samosa", 7],
+])
+def test_decode_cursor_rejects_operators_and_wrong_types(values):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor(values), PRODUCT_SORT)
+
+
+def test_decode_cursor_requires_dates_for_date_fields():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor(["2024-05-01T00:00:00", "order-1"]), ORDER_SORT)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor([{"$date": "yesterday"}, "order-1"]), ORDER_SORT)
+
+
+def test_keyset_filter_ascending():
+    assert keyset_filter(PRODUCT_SORT, ["Samosa", "p-1"]) == {"$or": [
+        {"name": {"$gt": "Samosa"}},
+        {"name": "Samosa", "id": {"$gt": "p-1"}},
+    ]}
+
+
+def test_keyset_filter_descending():
+    order_date = datetime(2024, 5, 1)
+    assert keyset_filter(ORDER_SORT, [order_date, "order-1"]) == {"$or": [
+        {"order_date": {"$lt": order_date}},
+        {"order_date": order_date, "id": {"$lt": "order-1"}},
+    ]}
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+
+def add_product(server, name, stock):
+    product = server.Product(
+        name=name, description=name, images=[], category="vegan", subcategory="snacks",
+        base_price=100, stock_quantity=stock
+    )
+    asyncio.run(server.db.products.insert_one(product.dict()))
+    return product.id
+
+
+def line(server, product_id, quantity):
+    return server.CartItem(product_id=product_id, quantity=quantity, calculated_price=100)
+
+
+def stock(server, product_id):
+    product = asyncio.run(server.db.products.find_one({"id": product_id}))
+    return product["stock_quantity"], product.get("stock_reservations", {})
+
+
+def test_reserve_and_release(server):
+    samosa = add_product(server, "Samosa", 5)
+
+    quantities = asyncio.run(server.reserve_stock("order-1", [line(server, samosa, 2), line(server, samosa, 1)]))
+    assert quantities == {samosa: 3}
+    assert stock(server, samosa) == (2, {"order-1": 3})
+
+    asyncio.run(server.release_stock("order-1", quantities))
+    assert stock(server, samosa) == (5, {})
+    # Releasing twice must not hand the stock back twice
+    asyncio.run(server.release_stock("order-1", quantities))
+    assert stock(server, samosa) == (5, {})
+
+
+def test_partially_short_order_takes_nothing(server):
+    samosa = add_product(server, "Samosa", 5)
+    dosa = add_product(server, "Dosa", 1)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.reserve_stock("order-1", [line(server, samosa, 2), line(server, dosa, 3)]))
+
+    assert excinfo.value.status_code == 409
+    assert excinfo.value.detail["items"] == [{"product_id": dosa, "requested": 3, "available": 1}]
+    assert stock(server, samosa) == (5, {})
+    assert stock(server, dosa) == (1, {})
+
+
+def test_short_lines_report_their_own_availability(server):
+    samosa = add_product(server, "Samosa", 5)
+    dosa = add_product(server, "Dosa", 0)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.reserve_stock("order-1", [
+            line(server, samosa, 4), line(server, samosa, 2), line(server, dosa, 1), line(server, "gone", 1)
+        ]))
+
+    assert excinfo.value.detail["items"] == [
+        {"product_id": samosa, "requested": 6, "available": 5},
+        {"product_id": dosa, "requested": 1, "available": 0},
+        {"product_id": "gone", "requested": 1, "available": 0},
+    ]
+    assert stock(server, samosa) == (5, {})
+
+
+def test_invalid_quantity_is_rejected(server):
+    samosa = add_product(server, "Samosa", 5)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.reserve_stock("order-1", [line(server, samosa, 0)]))
+    assert excinfo.value.status_code == 400
+    assert stock(server, samosa) == (5, {})